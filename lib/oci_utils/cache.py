@@ -7,10 +7,11 @@
 """ Common cache file utils for oci_utils.
 """
 
-import fcntl
 import json
 import os
+import stat
 import sys
+import threading
 from datetime import datetime
 import logging
 
@@ -115,32 +116,68 @@ def load_cache(global_file, user_file=None, max_age=None):
         if datetime.fromtimestamp(cache_timestamp) + max_age < datetime.now():
             return 0, None
 
+    # no lock needed: write_cache() renames a complete file over the cache,
+    # the opened file is either the previous or the new content
     try:
-        cache_fd = os.open(cache_fname, os.O_RDONLY)
-        cache_file = os.fdopen(cache_fd, 'r')
-        # acquire a shared lock
-        fcntl.lockf(cache_fd, fcntl.LOCK_SH)
+        cache_file = open(cache_fname, 'r')
     except IOError:
         # can't access file
         return 0, None
 
-    try:
-        cache_content = json.load(cache_file)
-    except (IOError, ValueError):
-        # can't read file
-        cache_timestamp = 0
-        cache_content = None
-
-    fcntl.lockf(cache_fd, fcntl.LOCK_UN)
-    cache_file.close()
+    with cache_file:
+        try:
+            cache_content = json.load(cache_file)
+        except (IOError, ValueError):
+            # can't read file
+            cache_timestamp = 0
+            cache_content = None
 
     return cache_timestamp, cache_content
 
 
-def write_cache(cache_content, cache_fname, fallback_fname=None, mode=None):
+def _open_replacement(fname, mode):
+    """
+    Create a temporary file in the directory of fname, to be renamed over
+    fname once written.
+
+    Parameters
+    ----------
+    fname: str
+        The full path of the file to replace.
+    mode: int
+        The octal representation of the file permissions, the ones of fname
+        (if it exists) are kept if not set.
+
+    Returns
+    -------
+        tuple
+            (file descriptor, temporary file path)
+
+    Raises
+    ------
+        OSError
+            If the file cannot be created.
+    """
+    cachedir = os.path.dirname(fname)
+    if not os.path.exists(cachedir):
+        os.makedirs(cachedir)
+    if mode is None:
+        try:
+            mode = stat.S_IMODE(os.stat(fname).st_mode)
+        except OSError:
+            # os.open() default
+            mode = 0o777
+    # unique per writer: concurrent writers never share a temporary file
+    tmp_fname = '%s.%d.%d.tmp' % (fname, os.getpid(), threading.get_ident())
+    return os.open(tmp_fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode), tmp_fname
+
+
+def write_cache(cache_content, cache_fname, fallback_fname=None, mode=None, durability='none'):
     """
     Save the cache_content as JSON data in cache_fname, or in fallback_fname
-    if cache_fname is not writeable.
+    if cache_fname is not writeable. The data are written to a temporary
+    file renamed over the target one: readers see either the previous or the
+    new content, never a partial one.
 
     Parameters
     ----------
@@ -152,58 +189,59 @@ def write_cache(cache_content, cache_fname, fallback_fname=None, mode=None):
         The full path of the fallback filename.
     mode: int
         The octal representation of the file permissions, if set.
+    durability: str
+        'none' to leave the data in the page cache, 'datasync' to flush the
+        data only (fdatasync), 'sync' to flush data and metadata (fsync),
+        the rename included.
 
     Returns
     -------
     Return the cache timestamp for success, None for failure
     """
+    assert durability in ('none', 'datasync', 'sync'), 'invalid durability [%s]' % durability
+    try:
+        json_content = json.dumps(cache_content)
+    except Exception:
+        sys.stderr.write("Internal error: invalid content for %s\n" % cache_fname)
+        return None
+
     fname = cache_fname
     # try to save in cache_file first
     try:
-        cachedir = os.path.dirname(cache_fname)
-        if not os.path.exists(cachedir):
-            os.makedirs(cachedir)
-        if mode is not None:
-            cache_fd = os.open(cache_fname, os.O_WRONLY | os.O_CREAT,
-                               mode)
-        else:
-            cache_fd = os.open(cache_fname, os.O_WRONLY | os.O_CREAT)
-        cache_file = os.fdopen(cache_fd, 'w')
+        cache_fd, tmp_fname = _open_replacement(cache_fname, mode)
     except (OSError, IOError):
         # can't write to cache_fname, try fallback_fname
         if not fallback_fname:
             return None
-        cachedir = os.path.dirname(fallback_fname)
         try:
-            if not os.path.exists(cachedir):
-                os.makedirs(cachedir)
-            if mode is not None:
-                cache_fd = os.open(fallback_fname,
-                                   os.O_WRONLY | os.O_CREAT, mode)
-            else:
-                cache_fd = os.open(fallback_fname,
-                                   os.O_WRONLY | os.O_CREAT)
-            cache_file = os.fdopen(cache_fd, 'w')
+            cache_fd, tmp_fname = _open_replacement(fallback_fname, mode)
             fname = fallback_fname
         except (OSError, IOError):
             # can't write to fallback file either, give up
             return None
-    try:
-        json_content = json.dumps(cache_content)
-    except Exception:
-        sys.stderr.write("Internal error: invalid content for %s\n" % fname)
 
     try:
-        # acquire exclusive lock
-        fcntl.lockf(cache_fd, fcntl.LOCK_EX)
-        cache_file.write(json_content)
-        cache_file.truncate()
-        cache_timestamp = get_timestamp(fname)
-        fcntl.lockf(cache_fd, fcntl.LOCK_UN)
-        cache_file.close()
+        with os.fdopen(cache_fd, 'w') as cache_file:
+            cache_file.write(json_content)
+            # the rename must not reach the disk before the data
+            if durability == 'datasync':
+                cache_file.flush()
+                os.fdatasync(cache_fd)
+            elif durability == 'sync':
+                cache_file.flush()
+                os.fsync(cache_fd)
+        os.replace(tmp_fname, fname)
+        if durability == 'sync':
+            dir_fd = os.open(os.path.dirname(fname) or '.', os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
     except Exception:
-        fcntl.lockf(cache_fd, fcntl.LOCK_UN)
-        cache_file.close()
+        try:
+            os.unlink(tmp_fname)
+        except OSError:
+            pass
         return None
 
-    return cache_timestamp
+    return get_timestamp(fname)
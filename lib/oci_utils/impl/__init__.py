@@ -97,6 +97,7 @@ def read_config():
     oci_utils_config.set('vnic', 'enabled', 'true')
     oci_utils_config.set('vnic', 'scan_interval', '60')
     oci_utils_config.set('vnic', 'vf_net', 'false')
+    oci_utils_config.set('vnic', 'keep_namespaces', 'false')
     oci_utils_config.add_section('public_ip')
     oci_utils_config.set('public_ip', 'enabled', 'true')
     oci_utils_config.set('public_ip', 'refresh_interval', '600')
@@ -0,0 +1,67 @@
+# oci-utils
+#
+# Copyright (c) 2021 Oracle and/or its affiliates. All rights reserved.
+# Licensed under the Universal Permissive License v 1.0 as shown
+# at http://oss.oracle.com/licenses/upl.
+
+""" Privileged helper started once through sudo by sudo_utils.
+
+Reads newline delimited json requests on stdin and writes one json reply
+per request on stdout. The helper exits when stdin is closed, i.e. when the
+process which started it goes away. Only the operations listed in _OPS are
+served.
+"""
+
+import json
+import os
+import sys
+
+
+def _unlink(path):
+    """
+    Remove a file, same semantic as rm -f.
+
+    Parameters
+    ----------
+    path: str
+        The full path of the file.
+
+    Returns
+    -------
+        int
+            0 on success or if the file does not exist, 1 otherwise.
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return 1
+    return 0
+
+
+_OPS = {'unlink': _unlink}
+
+
+def main():
+    """
+    Serve requests until stdin is closed.
+
+    Returns
+    -------
+        int
+            The exit code.
+    """
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            rc = _OPS[request['op']](request['path'])
+        except (ValueError, KeyError, TypeError):
+            rc = 2
+        sys.stdout.write(json.dumps({'rc': rc}) + '\n')
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
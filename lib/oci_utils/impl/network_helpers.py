@@ -7,6 +7,8 @@
 """ Helper module around network information.
 """
 
+import ctypes
+import functools
 import os
 import os.path
 import socket
@@ -17,8 +19,11 @@ from socket import inet_ntoa
 from struct import pack
 import re
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 from netaddr import IPNetwork
+from . import IP_CMD
 from . import sudo_utils
 
 
@@ -33,12 +38,192 @@ __all__ = ['get_interfaces',
            'remove_firewall_rule',
            'remove_static_ip_routes',
            'remove_static_ip_rules',
-           'get_network_namespace_infos']
+           'get_network_namespace_infos',
+           'IpBatch',
+           'ip_call',
+           'get_link_operstate',
+           'get_link_mtu',
+           'get_ip_rules',
+           'call_in_network_namespace',
+           'release_network_namespace']
 
 _CLASS_NET_DIR = '/sys/class/net'
 _NM_CONF_DIR = "/etc/NetworkManager/conf.d/"
+# where ip-netns(8) keeps the named namespaces; bytes as the names were read from the 'ip netns list' output
+_NETNS_DIR = b'/var/run/netns'
+# setns(2) namespace type of a network namespace
+_CLONE_NEWNET = 0x40000000
 _logger = logging.getLogger('oci-utils.net-helper')
 
+# the IpBatch being filled by the current thread, if any.
+_ip_batch = threading.local()
+# serializes the /etc/iproute2/rt_tables updates of concurrent threads
+_rt_tables_lock = threading.Lock()
+# (modification time, set of names) of /etc/iproute2/rt_tables last read
+_rt_tables_cache = None
+
+
+class IpBatch:
+    """
+    Context manager collecting the ip(8) commands issued through ip_call()
+    within it, and running them on exit, in order, with one 'ip -batch' per
+    run of consecutive commands for the same namespace instead of one ip
+    process each.
+
+    Only commands whose result is not needed right away should be issued
+    within a batch: ip_call() returns 0 for queued commands and the failures
+    are reported on exit.
+
+    Parameters
+    ----------
+    force: bool
+        Keep going after a failed command, otherwise the batch stops at the
+        first failure.
+    """
+
+    def __init__(self, force=True):
+        # list of (namespace ('' for default one), list of command lines)
+        self._commands = []
+        self._force = force
+        self._outer = None
+
+    def add(self, args, namespace=None):
+        """
+        Queue an ip command.
+
+        Parameters
+        ----------
+        args: list
+            The ip arguments, without the ip command itself.
+        namespace: str
+            The network namespace to run the command in, if any.
+        """
+        _ns = namespace or ''
+        if not self._commands or self._commands[-1][0] != _ns:
+            self._commands.append((_ns, []))
+        self._commands[-1][1].append(' '.join(str(_a) for _a in args))
+
+    def __enter__(self):
+        self._outer = getattr(_ip_batch, 'current', None)
+        _ip_batch.current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _ip_batch.current = self._outer
+        # nothing is run if the block failed
+        if exc_type is None:
+            self.flush()
+
+    def flush(self):
+        """
+        Run the queued commands.
+
+        Raise
+        -----
+            Exception: if any of the commands failed.
+        """
+        _failed = []
+        _commands, self._commands = self._commands, []
+        for _ns, _lines in _commands:
+            _cmd = [IP_CMD]
+            if _ns:
+                _cmd.extend(['-netns', _ns])
+            if self._force:
+                _cmd.append('-force')
+            # the commands are read from stdin, no file is written
+            _cmd.extend(['-batch', '-'])
+            if sudo_utils.call_input(_cmd, '\n'.join(_lines) + '\n') != 0:
+                _failed.append(_ns or 'default')
+                if not self._force:
+                    break
+        if _failed:
+            raise Exception('ip batch failed in namespace(s) %s' % ', '.join(_failed))
+
+
+def ip_call(args, namespace=None):
+    """
+    Run an ip command, or queue it if an IpBatch is active.
+
+    Parameters
+    ----------
+    args: list
+        The ip arguments, without the ip command itself.
+    namespace: str
+        The network namespace to run the command in, if any.
+
+    Returns
+    -------
+        int
+            The ip command return code, 0 when queued.
+    """
+    _batch = getattr(_ip_batch, 'current', None)
+    if _batch is not None:
+        _batch.add(args, namespace)
+        return 0
+    _cmd = [IP_CMD]
+    if namespace:
+        _cmd.extend(['-netns', namespace])
+    _cmd.extend(args)
+    return sudo_utils.call(_cmd)
+
+
+def _read_link_attribute(ifname, attribute):
+    """
+    Read an attribute of a network link from sysfs.
+
+    Parameters
+    ----------
+    ifname: str
+        The link name, in the current namespace.
+    attribute: str
+        The attribute name, e.g. 'operstate'.
+
+    Returns
+    -------
+        str
+            The attribute value, None if the link or the attribute does not exist.
+    """
+    try:
+        with open(os.path.join(_CLASS_NET_DIR, ifname, attribute)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def get_link_operstate(ifname):
+    """
+    Get the operational state of a network link without running ip.
+
+    Parameters
+    ----------
+    ifname: str
+        The link name, in the current namespace.
+
+    Returns
+    -------
+        str
+            The state, e.g. 'up' or 'down', None if the link is not found.
+    """
+    return _read_link_attribute(ifname, 'operstate')
+
+
+def get_link_mtu(ifname):
+    """
+    Get the MTU of a network link without running ip.
+
+    Parameters
+    ----------
+    ifname: str
+        The link name, in the current namespace.
+
+    Returns
+    -------
+        int
+            The MTU, None if the link is not found.
+    """
+    _mtu = _read_link_attribute(ifname, 'mtu')
+    return int(_mtu) if _mtu else None
+
 
 def is_network_namespace_exists(name):
     """
@@ -87,13 +272,112 @@ def destroy_network_namespace(name):
         raise Exception('Cannot delete network namespace')
 
 
+def release_network_namespace(name):
+    """
+    Empty a network namespace the way destroying it would, keeping it for
+    a later use: namespace creation and destruction are serialized in the
+    kernel and slow. The virtual links are deleted and the physical ones
+    moved back to the default namespace.
+
+    Parameter
+    ---------
+      name : namespace name as str
+
+    raise
+    ------
+      exception :in case of error
+    """
+    _logger.debug('Releasing network namespace [%s]', name)
+    try:
+        # deleting a link may have deleted the ones on top of it already: the batch goes on errors
+        with IpBatch():
+            for _link in _get_link_infos(name):
+                if 'LOOPBACK' in (_link['flags'] or ()):
+                    continue
+                if _link.get('subtype'):
+                    ip_call(['link', 'del', 'dev', _link['device']], name)
+                else:
+                    ip_call(['link', 'set', 'dev', _link['device'], 'netns', '1'], name)
+    except Exception as e:
+        raise Exception('Cannot release network namespace') from e
+
+
+@functools.lru_cache(maxsize=1)
+def _libc_setns():
+    """
+    Get the setns(2) libc function.
+
+    Returns
+    -------
+        The ctypes function or None if the libc does not provide it.
+    """
+    try:
+        return ctypes.CDLL(None, use_errno=True).setns
+    except (OSError, AttributeError):
+        return None
+
+
+def call_in_network_namespace(name, cmd):
+    """
+    Run a command in a network namespace, as 'ip netns exec' does.
+
+    When running as root, the command is started from a short lived thread
+    moved to the namespace by setns(2): only that thread changes namespace
+    and the child process inherits it, no sudo nor ip processes are involved.
+    Otherwise, or if setns(2) is not available, 'sudo ip netns exec' is used.
+
+    Parameters
+    ----------
+    name: str
+        The namespace name.
+    cmd: list
+        Command line as list of strings.
+
+    Returns
+    -------
+        int
+            The command return code.
+    """
+    _setns = _libc_setns()
+    if _setns is None or os.geteuid() != 0:
+        return sudo_utils.call([IP_CMD, 'netns', 'exec', name, *cmd])
+
+    _result = {}
+
+    def _run():
+        try:
+            _fd = os.open('/var/run/netns/%s' % name, os.O_RDONLY)
+            try:
+                if _setns(_fd, _CLONE_NEWNET) != 0:
+                    _errno = ctypes.get_errno()
+                    raise OSError(_errno, os.strerror(_errno))
+            finally:
+                os.close(_fd)
+            _result['rc'] = subprocess.call(cmd)
+        except OSError as e:
+            _result['error'] = e
+
+    _thread = threading.Thread(target=_run, name='netns-%s' % name)
+    _thread.start()
+    _thread.join()
+    if 'error' in _result:
+        _logger.debug('cannot run %s in namespace %s: %s', cmd, name, _result['error'])
+        return 1
+    return _result['rc']
+
+
 def _get_namespaces():
     """
-    Gets list of network namespace
+    Gets list of network namespace, the ones 'ip netns list' reports,
+    without running it: they are the entries of the netns directory.
     Returns:
-       list of names as string
+       list of names as bytes
     """
-    return [name.split(b' ')[0] for name in subprocess.check_output(['/usr/sbin/ip', 'netns', 'list']).splitlines()]
+    try:
+        return os.listdir(_NETNS_DIR)
+    except FileNotFoundError:
+        # no namespace created since boot
+        return []
 
 
 def _get_link_infos(namespace):
@@ -178,7 +462,7 @@ def _get_link_infos(namespace):
             'type': obj.get('link_type'),
             'flags': obj.get('flags')
         })
-        _logger.debug('new system interface found : %s' % _addr_info)
+        _logger.debug('new system interface found : %s', _addr_info)
         _infos.append(_addr_info)
 
     # now loop again to set the 'is_vf' flag
@@ -218,14 +502,14 @@ def get_network_namespace_infos():
            }
 
     """
-    _result = {}
     _ns_list = _get_namespaces()
     # also gather info from default namespace
     _ns_list.append('')
-    for _ns in _ns_list:
-        _result[_ns] = _get_link_infos(_ns)
-
-    return _result
+    if len(_ns_list) == 1:
+        return {'': _get_link_infos('')}
+    # one ip command per namespace, run concurrently
+    with ThreadPoolExecutor(max_workers=min(8, len(_ns_list))) as _executor:
+        return dict(zip(_ns_list, _executor.map(_get_link_infos, _ns_list)))
 
 
 def get_interfaces():
@@ -369,39 +653,51 @@ def add_route_table(table_name):
         bool
             True for success or table already exists, False for failure.
     """
+    global _rt_tables_cache
+    with _rt_tables_lock:
+        # the file is only parsed again if it changed since the last call
+        _mtime = os.stat('/etc/iproute2/rt_tables').st_mtime_ns
+        if _rt_tables_cache is not None and _rt_tables_cache[0] == _mtime and table_name in _rt_tables_cache[1]:
+            _logger.debug('routing table with name %s already exists', table_name)
+            return True
+        # first , find a free number for the table
+        tables_num = []
+        _names = set()
+        _all_new_lines = []
+        with open('/etc/iproute2/rt_tables') as f:
+            for line in f.readlines():
+                _all_new_lines.append(line)
+                if len(line.strip()) > 0 and not line.startswith('#'):
+                    # trust the format of that file
+                    _fields = line.split()
+                    tables_num.append(int(_fields[0]))
+                    _names.add(_fields[1])
+        _rt_tables_cache = (_mtime, _names)
+        # check if table already exits
+        if table_name in _names:
+            _logger.debug('routing table with name %s already exists', table_name)
+            return True
+        _new_table_num_to_use = -1
+        for n in range(10, 255):
+            if n not in tables_num:
+                _new_table_num_to_use = n
+                break
+        _logger.debug('new table index : %d', _new_table_num_to_use)
+        _all_new_lines.append('%d\t%s\n' % (_new_table_num_to_use, table_name))
+
+        if sudo_utils.copy_file('/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck') != 0:
+            _logger.debug('cannot backup file [%s] to %s', '/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck')
+            return False
+        if sudo_utils.write_to_file('/etc/iproute2/rt_tables', ''.join(_all_new_lines)) != 0:
+            _logger.debug('cannot write new content to  file [%s]', '/etc/iproute2/rt_tables')
+            sudo_utils.copy_file('/etc/iproute2/rt_tables.bck', '/etc/iproute2/rt_tables')
+            return False
+        _names.add(table_name)
+        _rt_tables_cache = (os.stat('/etc/iproute2/rt_tables').st_mtime_ns, _names)
+
+        sudo_utils.delete_file('/etc/iproute2/rt_tables.bck')
 
-    # first , find a free number for the table
-    tables_num = []
-    _all_new_lines = []
-    with open('/etc/iproute2/rt_tables') as f:
-        for line in f.readlines():
-            _all_new_lines.append(line)
-            if len(line.strip()) > 0 and not line.startswith('#'):
-                # trust the format of that file
-                tables_num.append(int(line.split()[0]))
-                # check if table already exits
-                if line.split()[1] == table_name:
-                    _logger.debug('routing table with name %s already exists' % table_name)
-                    return True
-    _new_table_num_to_use = -1
-    for n in range(10, 255):
-        if n not in tables_num:
-            _new_table_num_to_use = n
-            break
-    _logger.debug('new table index : %d' % _new_table_num_to_use)
-    _all_new_lines.append('%d\t%s\n' % (_new_table_num_to_use, table_name))
-
-    if sudo_utils.copy_file('/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck') != 0:
-        _logger.debug('cannot backup file [%s] to %s' % ('/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck'))
-        return False
-    if sudo_utils.write_to_file('/etc/iproute2/rt_tables', ''.join(_all_new_lines)) != 0:
-        _logger.debug('cannot write new content to  file [%s]' '/etc/iproute2/rt_tables')
-        sudo_utils.copy_file('/etc/iproute2/rt_tables.bck', '/etc/iproute2/rt_tables')
-        return False
-
-    sudo_utils.delete_file('/etc/iproute2/rt_tables.bck')
-
-    return True
+        return True
 
 
 def delete_route_table(table_name):
@@ -417,27 +713,28 @@ def delete_route_table(table_name):
         bool
             True for success, False for failure
     """
-    _all_new_lines = []
-    with open('/etc/iproute2/rt_tables') as f:
-        _all_lines = f.readlines()
-        for line in _all_lines:
-            # format is '<index>\t<table name>'
-            _s_l = line.split()
-            if len(_s_l) > 1 and _s_l[1] == table_name:
-                # foudn the table name , skip this line
-                continue
-            _all_new_lines.append(line)
-
-    if sudo_utils.copy_file('/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck') != 0:
-        _logger.debug('cannot backup file [%s] to %s' % ('/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck'))
-        return False
-    if sudo_utils.write_to_file('/etc/iproute2/rt_tables', ''.join(_all_new_lines)) != 0:
-        _logger.debug('cannot write new content to  file [%s]' '/etc/iproute2/rt_tables')
-        sudo_utils.copy_file('/etc/iproute2/rt_tables.bck', '/etc/iproute2/rt_tables')
-        return False
-    sudo_utils.delete_file('/etc/iproute2/rt_tables.bck')
+    with _rt_tables_lock:
+        _all_new_lines = []
+        with open('/etc/iproute2/rt_tables') as f:
+            _all_lines = f.readlines()
+            for line in _all_lines:
+                # format is '<index>\t<table name>'
+                _s_l = line.split()
+                if len(_s_l) > 1 and _s_l[1] == table_name:
+                    # foudn the table name , skip this line
+                    continue
+                _all_new_lines.append(line)
+
+        if sudo_utils.copy_file('/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck') != 0:
+            _logger.debug('cannot backup file [%s] to %s', '/etc/iproute2/rt_tables', '/etc/iproute2/rt_tables.bck')
+            return False
+        if sudo_utils.write_to_file('/etc/iproute2/rt_tables', ''.join(_all_new_lines)) != 0:
+            _logger.debug('cannot write new content to  file [%s]', '/etc/iproute2/rt_tables')
+            sudo_utils.copy_file('/etc/iproute2/rt_tables.bck', '/etc/iproute2/rt_tables')
+            return False
+        sudo_utils.delete_file('/etc/iproute2/rt_tables.bck')
 
-    return True
+        return True
 
 
 def network_prefix_to_mask(prefix):
@@ -463,19 +760,22 @@ def remove_static_ip_routes(link_name):
     Return:
         None
     """
-    _logger.debug('looking for ip routes for dev=%s' % link_name)
+    _logger.debug('looking for ip routes for dev=%s', link_name)
     _lines = []
     try:
         _lines = subprocess.check_output(['/sbin/ip', 'route', 'show', 'dev', link_name]).splitlines()
     except subprocess.CalledProcessError:
         pass
-    _logger.debug('routes found [%s]' % _lines)
-    for _line in _lines:
-        _command = ['/sbin/ip', 'route', 'del']
-        _command.extend(_line.decode().strip().split(' '))
-        _out = sudo_utils.call_output(_command)
-        if _out is not None and len(_out) > 0:
-            _logger.warning('removal of ip route (%s) failed' % _line)
+    _logger.debug('routes found [%s]', _lines)
+    if not _lines:
+        return
+    # one ip process for all of them, forced: a failed removal does not stop the next ones
+    try:
+        with IpBatch(force=True):
+            for _line in _lines:
+                ip_call(['route', 'del'] + _line.decode().strip().split(' '))
+    except Exception as e:
+        _logger.warning('removal of ip routes of %s failed: %s', link_name, str(e))
 
 
 def add_static_ip_route(*args, **kwargs):
@@ -488,14 +788,11 @@ def add_static_ip_route(*args, **kwargs):
         *args : argument list as passed to the ip-route(8) command
     Return:
         (code,message): command code , on failure a message is sent back
+        The route is queued if an IpBatch is active.
     """
-    routing_cmd = ['/usr/sbin/ip']
-    if kwargs and 'namespace' in kwargs:
-        routing_cmd.extend(['-netns', kwargs['namespace']])
-    routing_cmd.extend(['route', 'add'])
-    routing_cmd.extend(args)
-    _logger.debug('adding route : [%s]' % ' '.join(routing_cmd))
-    _ret = sudo_utils.call(routing_cmd)
+    if _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug('adding route : [%s] in namespace [%s]', ' '.join(args), kwargs.get('namespace'))
+    _ret = ip_call(['route', 'add', *args], kwargs.get('namespace'))
     if _ret != 0:
         _logger.warning('add of ip route failed')
         return (1, 'add of ip route failed')
@@ -528,22 +825,33 @@ def remove_mac_from_nm(mac):
     if not os.path.exists(_NM_CONF_DIR):
         if sudo_utils.create_dir(_NM_CONF_DIR) != 0:
             raise Exception('Cannot create directory %s' % _NM_CONF_DIR)
-        _logger.debug('%s created' % _NM_CONF_DIR)
+        _logger.debug('%s created', _NM_CONF_DIR)
 
     _cf = os.path.join(_NM_CONF_DIR, _compute_nm_conf_filename(mac))
-    if sudo_utils.create_file(_cf) != 0:
-        raise Exception('Cannot create file %s' % _cf)
-
-    _logger.debug('%s created' % _cf)
 
     nm_conf = StringIO()
     nm_conf.write('[keyfile]\n')
     nm_conf.write('unmanaged-devices+=mac:%s\n' % mac)
 
-    sudo_utils.write_to_file(_cf, nm_conf.getvalue())
-
+    _content = nm_conf.getvalue()
     nm_conf.close()
 
+    # nothing to do if the interface is already unmanaged, e.g. on a new configuration run
+    try:
+        with open(_cf, 'r') as _f:
+            if _f.read() == _content:
+                _logger.debug('%s already exists', _cf)
+                return
+    except OSError:
+        pass
+
+    # the file is created by the write, in a single privileged command
+    _ret = sudo_utils.write_to_file(_cf, _content)
+    if _ret != 0:
+        raise Exception('Cannot create file %s' % _cf)
+
+    _logger.debug('%s created', _cf)
+
 
 def add_mac_to_nm(mac):
     """
@@ -559,7 +867,7 @@ def add_mac_to_nm(mac):
     if os.path.exists(_cf):
         sudo_utils.delete_file(_cf)
     else:
-        _logger.debug('no NetworkManager file for %s' % mac)
+        _logger.debug('no NetworkManager file for %s', mac)
 
 
 def remove_ip_addr(device, ip_addr, namespace=None):
@@ -583,30 +891,34 @@ def remove_ip_addr(device, ip_addr, namespace=None):
         raise Exception('Cannot remove ip address')
 
 
-def remove_ip_addr_rules(ip_addr):
+def remove_ip_addr_rules(*ip_addrs):
     """
-    Remove all ip rules set for an  ip address
+    Remove all ip rules set for ip addresses, the rules are listed once
+    whatever the number of addresses.
+    If an IpBatch is active the deletions are queued: a failed one is not
+    warned about here but makes the batch fail when it is run.
     Parameter:
-        ip_addr : the ip address as string
+        ip_addrs : the ip addresses as string
     Return:
         None
     """
-    _lines = ''
+    _addrs = frozenset(ip_addrs)
+    _lines = []
     try:
-        _lines = subprocess.check_output(['/sbin/ip', 'rule', 'list']).splitlines()
+        _lines = subprocess.check_output(['/sbin/ip', 'rule', 'list']).decode('utf-8').splitlines()
     except subprocess.CalledProcessError:
         pass
-    # for any line (i.e rules) if the ip is involved , grab the priority number
-    _matches = [_line for _line in _lines if ip_addr in _line.split()]
+    # for any line (i.e rules) if one of the ips is involved , grab the priority number
+    _matches = [_line for _line in _lines if not _addrs.isdisjoint(_line.split())]
     # now grab the priority numbers
     # lines are like ''0:\tfrom all lookup local '' : take first item and remove trailing ':'
     prio_nums = [_l.split()[0][:-1] for _l in _matches]
 
-    # now del all rules by priority number
+    # now del all rules by priority number, ip_call() returns 0 for queued ones
     for prio_num in prio_nums:
-        _ret = sudo_utils.call(['/sbin/ip', 'rule', 'del', 'pref', prio_num])
+        _ret = ip_call(['rule', 'del', 'pref', prio_num])
         if _ret != 0:
-            _logger.warning('cannot delete rule [%s]' % prio_num)
+            _logger.warning('cannot delete rule [%s]', prio_num)
 
 
 def remove_static_ip_rules(link_name):
@@ -618,24 +930,53 @@ def remove_static_ip_rules(link_name):
     Return:
         None
     """
-    _logger.debug('looking for ip rules for dev=%s' % link_name)
+    _logger.debug('looking for ip rules for dev=%s', link_name)
     _lines = []
     try:
         _lines = subprocess.check_output(['/sbin/ip', 'rule', 'show', 'lookup', link_name]).splitlines()
     except subprocess.CalledProcessError:
 
         pass
-    _logger.debug('rules found [%s]' % _lines)
-    for _line in _lines:
+    _logger.debug('rules found [%s]', _lines)
+    if not _lines:
+        return
+    # one ip process for all of them, forced: a failed removal does not stop the next ones
+    try:
+        with IpBatch(force=True):
+            for _line in _lines:
+                _command = ['rule', 'del']
+                # all line listed are like '<rule number>:\t<rule as string> '
+                # when underlying device is down (i.e virtual network is down)
+                # the command append '[detached]' we have to remove this
+                _command.extend(
+                    re.compile("\d:\t").split(_line.decode().strip())[1].replace('[detached] ', '').split(' '))
+                ip_call(_command)
+    except Exception as e:
+        _logger.warning('cannot delete rules of %s: %s', link_name, str(e))
+
+
+def get_ip_rules():
+    """
+    Get the source based rules of the default namespace.
 
-        _command = ['/sbin/ip', 'rule', 'del']
-        # all line listed are like '<rule number>:\t<rule as string> '
-        # when underlying device is down (i.e virtual network is down)
-        # the command append '[detached]' we have to remove this
-        _command.extend(re.compile("\d:\t").split(_line.decode().strip())[1].replace('[detached] ', '').split(' '))
-        _out = sudo_utils.call_output(_command)
-        if _out is not None and len(_out) > 0:
-            _logger.warning('cannot delete rule [%s]: %s' % (' '.join(_command), str(_out)))
+    Returns
+    -------
+        set
+            The (source address, table name) tuple of each 'from <addr> lookup <table>' rule.
+    """
+    _rules = set()
+    try:
+        _lines = subprocess.check_output(['/sbin/ip', 'rule', 'show']).decode('utf-8').splitlines()
+    except subprocess.CalledProcessError:
+        return _rules
+    for _line in _lines:
+        # '<priority>:\tfrom <addr> lookup <table> '
+        _fields = _line.split()
+        try:
+            _rules.add((_fields[_fields.index('from') + 1], _fields[_fields.index('lookup') + 1]))
+        except (ValueError, IndexError):
+            continue
+    return _rules
 
 
 def add_static_ip_rule(*args, **kwargs):
@@ -647,11 +988,11 @@ def add_static_ip_rule(*args, **kwargs):
         *args : argument list as passed to the ip-rule(8) command
     Return:
         (code,message): command code , on failure a message is sent back
+        The rule is queued if an IpBatch is active.
     """
-    ip_rule_cmd = ['/usr/sbin/ip', 'rule', 'add']
-    ip_rule_cmd.extend(args)
-    _logger.debug('adding rule : [%s]' % ' '.join(args))
-    _ret = sudo_utils.call(ip_rule_cmd)
+    if _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug('adding rule : [%s]', ' '.join(args))
+    _ret = ip_call(['rule', 'add', *args])
     if _ret != 0:
         _logger.warning('add of ip rule failed')
         return (1, 'add of ip rule failed')
@@ -671,7 +1012,8 @@ def add_firewall_rule(*args, **kwargs):
     """
     fw_rule_cmd = ['/usr/sbin/iptables']
     fw_rule_cmd.extend(args)
-    _logger.debug('adding fw rule : [%s]' % ' '.join(args))
+    if _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug('adding fw rule : [%s]', ' '.join(args))
     _ret = sudo_utils.call(fw_rule_cmd)
     if _ret != 0:
         _logger.warning('add of firewall rule failed')
@@ -694,7 +1036,8 @@ def remove_firewall_rule(*args):
     """
     fw_rule_cmd = ['/usr/sbin/iptables']
     fw_rule_cmd.extend(args)
-    _logger.debug('removing fw rule : [%s]' % ' '.join(args))
+    if _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug('removing fw rule : [%s]', ' '.join(args))
     _ret = sudo_utils.call(fw_rule_cmd)
     if _ret != 0:
         _logger.warning('removal of firewall rule failed')
@@ -714,12 +1057,54 @@ def kill_processes_in_namespace(namespace):
     --------
         None
     """
-    _logger.debug('killing process for namespace [%s]' % namespace)
-    _out = sudo_utils.call_output(['/usr/sbin/ip', 'netns', 'pids', namespace])
-    # one pid per line
-    if _out:
-        for pid in _out.splitlines():
-            try:
-                os.kill(int(pid), signal.SIGKILL)
-            except (ValueError, OSError) as e:
-                _logger.warning('Cannot terminate [%s]: %s ' % (pid, str(e)))
+    _logger.debug('killing process for namespace [%s]', namespace)
+    _pids = _get_namespace_pids(namespace)
+    if _pids is None:
+        _out = sudo_utils.call_output([IP_CMD, 'netns', 'pids', namespace])
+        # one pid per line
+        _pids = _out.splitlines() if _out else []
+    for pid in _pids:
+        try:
+            os.kill(int(pid), signal.SIGKILL)
+        except (ValueError, OSError) as e:
+            _logger.warning('Cannot terminate [%s]: %s ', pid, str(e))
+
+
+def _get_namespace_pids(namespace):
+    """
+    List the processes of a network namespace, as 'ip netns pids' does: the
+    network namespace of every process in /proc is compared to the one bound
+    to the namespace name. Reading the namespace of other users' processes
+    needs root.
+
+    Parameters
+    ----------
+    namespace: str
+        The namespace name.
+
+    Returns
+    -------
+        list
+            The pids as int, None if the processes cannot be looked up from
+            this process.
+    """
+    if os.geteuid() != 0:
+        return None
+    try:
+        _ns_stat = os.stat('/var/run/netns/%s' % namespace)
+    except OSError as e:
+        _logger.debug('cannot stat namespace %s: %s', namespace, str(e))
+        return None
+    _ns_id = (_ns_stat.st_dev, _ns_stat.st_ino)
+    _pids = []
+    for _entry in os.listdir('/proc'):
+        if not _entry.isdigit():
+            continue
+        try:
+            _stat = os.stat('/proc/%s/ns/net' % _entry)
+        except OSError:
+            # process gone, or kernel thread
+            continue
+        if (_stat.st_dev, _stat.st_ino) == _ns_id:
+            _pids.append(int(_entry))
+    return _pids
@@ -6,8 +6,8 @@
 
 __all__ = ['NetworkInterfaceSetupHelper', '_intf_dict']
 
+import functools
 import logging
-from . import sudo_utils
 from ..metadata import InstanceMetadata
 from . import network_helpers as NetworkHelpers
 
@@ -15,6 +15,30 @@ from . import network_helpers as NetworkHelpers
 _logger = logging.getLogger('oci-utils.network_interface')
 
 
+@functools.lru_cache(maxsize=1)
+def _is_bm_shape():
+    """
+    Checks if this instance is a bare metal one; the shape does not change
+    during the instance life, the metadata are fetched once per process.
+    Use _is_bm_shape.cache_clear() to force a new lookup.
+
+    Returns
+    -------
+        bool
+            True if the instance shape is a BM one.
+    Raise
+    -----
+        IOError
+            error during communication with metadata endpoint
+    """
+    return InstanceMetadata()['instance']['shape'].startswith('BM')
+
+
+# released _intf_dict instances, reused by _intf_dict.acquire()
+_INTF_DICT_POOL = []
+_INTF_DICT_POOL_MAX = 64
+
+
 class _intf_dict(dict):
     """
     Creates a new dictionnary representing an interface
@@ -22,6 +46,8 @@ class _intf_dict(dict):
         CONFSTATE  'uncfg' indicates missing IP config, 'missing' missing VNIC,
                         'excl' excluded (-X), '-' hist configuration match oci vcn configuration
     """
+    # all state is in the dict itself: no per-instance __dict__ nor __weakref__
+    __slots__ = ()
 
     def __init__(self, other=None):
         if other:
@@ -29,8 +55,34 @@ class _intf_dict(dict):
         else:
             super().__init__(CONFSTATE='uncfg')
 
+    @classmethod
+    def acquire(cls, other=None):
+        """
+        Get an interface dict, reusing a released one if any.
+        Same parameter as the constructor.
+        """
+        try:
+            _intf = _INTF_DICT_POOL.pop()
+        except IndexError:
+            return cls(other)
+        if other:
+            dict.update(_intf, other)
+        else:
+            dict.__setitem__(_intf, 'CONFSTATE', 'uncfg')
+        return _intf
+
+    def release(self):
+        """
+        Give this interface dict back for reuse by acquire(); it must not
+        be used anymore by the caller.
+        """
+        self.clear()
+        if len(_INTF_DICT_POOL) < _INTF_DICT_POOL_MAX:
+            _INTF_DICT_POOL.append(self)
+
     def __eq__(self, other):
-        return self['MAC'].upper() == other['MAC'].upper()
+        # MAC addresses are stored upper case, see __setitem__
+        return self['MAC'] == other['MAC']
 
     def __missing__(self, key):
         return '-'
@@ -44,21 +96,27 @@ class _intf_dict(dict):
 
     @staticmethod
     def _to_str(value):
-        if isinstance(value, bytes):
+        _type = type(value)
+        if _type is bytes:
             return value.decode()
-        if not isinstance(value, str):
+        if _type is not str:
             return str(value)
         return value
 
     def __setitem__(self, key, value):
         """
-        everything stored as str
+        everything stored as str, MAC address stored upper case
         """
 
-        if isinstance(value, list):
-            super().__setitem__(key, [_intf_dict._to_str(_v) for _v in value])
-        else:
-            super().__setitem__(key, _intf_dict._to_str(value))
+        # most values are already str, check for that first
+        if value.__class__ is not str:
+            if isinstance(value, list):
+                value = [_intf_dict._to_str(_v) for _v in value]
+            else:
+                value = _intf_dict._to_str(value)
+        if key == 'MAC':
+            value = value.upper()
+        super().__setitem__(key, value)
 
 
 class NetworkInterfaceSetupHelper:
@@ -75,9 +133,11 @@ class NetworkInterfaceSetupHelper:
         self.info = interface_info
         self.ns = namespace_name
 
-    def setup(self):
+    def setup(self, is_bm=None):
         """
-        Setups the interface.
+        Setups the interface, bringing it up first if needed.
+        parameter:
+          is_bm : [optional] True on bare metal instances, looked up if not given
         returns:
             None
         raises:
@@ -85,65 +145,55 @@ class NetworkInterfaceSetupHelper:
         """
         # for BM case , create virtual interface if needed
 
-        try:
-            _metadata = InstanceMetadata().refresh()
-        except IOError as e:
-            raise Exception('cannot get instance metadata') from e
-        _is_bm_shape = _metadata['instance']['shape'].startswith('BM')
+        _is_bm = is_bm
+        if _is_bm is None:
+            try:
+                _is_bm = _is_bm_shape()
+            except IOError as e:
+                raise Exception('cannot get instance metadata') from e
 
         _macvlan_name = None
         _vlan_name = ''
-        if _is_bm_shape and self.info['VLTAG'] != "0":
-
-            _vlan_name = '%sv%s' % (self.info['IFACE'], self.info['VLTAG'])
-            _macvlan_name = "%s.%s" % (self.info['IFACE'], self.info['VLTAG'])
-
-            _ip_cmd = ['/usr/sbin/ip']
-            if self.info.has('NS'):
-                _ip_cmd.extend(['netns', 'exec', self.info['NS'], '/usr/sbin/ip'])
-
-            _ip_cmd.extend(['link', 'add', 'link', self.info['IFACE'], 'name', _macvlan_name, 'address',
-                            self.info['MAC'], 'type', 'macvlan'])
-            _logger.debug('creating macvlan [%s]', _macvlan_name)
-            ret = sudo_utils.call(_ip_cmd)
-            if ret != 0:
-                raise Exception("cannot create MAC VLAN interface %s for MAC address %s" %
-                                (_macvlan_name, self.info['MAC']))
-
-            if self.info.has('NS'):
-                # if physical iface/nic is in a namespace pull out the created mac vlan
-                sudo_utils.call(['/usr/sbin/ip', 'netns', 'exec', self.info['NS'],
-                                 '/usr/sbin/ip', 'link', 'set', _macvlan_name, 'netns', '1'])
-
-            # create an ip vlan on top of the mac vlan
-            ret = sudo_utils.call(['/usr/sbin/ip', 'link', 'add', 'link', _macvlan_name,
-                                   'name', _vlan_name, 'type', 'vlan', 'id', self.info['VLTAG']])
-            if ret != 0:
-                raise Exception("cannot create VLAN %s on MAC VLAN %s" % (_vlan_name, _macvlan_name))
-
-        _intf_dev_to_use = None
-        if _vlan_name:
-            # add the addr on the vlan intf then (BM case)
-            _intf_dev_to_use = _vlan_name
-        else:
-            # add the addr on the intf then (VM case)
-            _intf_dev_to_use = self.info['IFACE']
-
-        # move the iface(s) to the target namespace if requested
-        if self.ns is not None:
-            if _is_bm_shape and _macvlan_name:
-                _logger.debug("macvlan link move %s", self.ns)
-                ret = sudo_utils.call(['/usr/sbin/ip', 'link', 'set', 'dev',
-                                       _macvlan_name, 'netns', self.ns])
-                if ret != 0:
-                    raise Exception("cannot move MAC VLAN $macvlan into namespace %s" % self.ns)
-
-            _logger.debug("%s link move %s", _intf_dev_to_use, self.ns)
-            ret = sudo_utils.call(['/usr/sbin/ip', 'link', 'set', 'dev',
-                                   _intf_dev_to_use, 'netns', self.ns])
-            if ret != 0:
-                raise Exception("cannot move interface %s into namespace %s" %
-                                (_intf_dev_to_use, self.ns))
+        # the links are created and moved in one ip batch and configured in
+        # a second one, within the target namespace; both stop at the first error.
+        try:
+            with NetworkHelpers.IpBatch(force=False):
+                # if interface is not up bring it up, the state may have changed since it was collected;
+                # sysfs only shows the links of the default namespace
+                if self.info['STATE'] != 'up' \
+                        and (self.info.has('NS') or NetworkHelpers.get_link_operstate(self.info['IFACE']) != 'up'):
+                    _logger.debug('Bringing intf [%s] up ', self.info['IFACE'])
+                    NetworkHelpers.ip_call(['link', 'set', 'dev', self.info['IFACE'], 'up'], self.info.get('NS'))
+
+                if _is_bm and self.info['VLTAG'] != "0":
+
+                    _vlan_name = '%sv%s' % (self.info['IFACE'], self.info['VLTAG'])
+                    _macvlan_name = "%s.%s" % (self.info['IFACE'], self.info['VLTAG'])
+
+                    _logger.debug('creating macvlan [%s]', _macvlan_name)
+                    NetworkHelpers.ip_call(['link', 'add', 'link', self.info['IFACE'], 'name', _macvlan_name,
+                                            'address', self.info['MAC'], 'type', 'macvlan'], self.info.get('NS'))
+
+                    if self.info.has('NS'):
+                        # if physical iface/nic is in a namespace pull out the created mac vlan
+                        NetworkHelpers.ip_call(['link', 'set', _macvlan_name, 'netns', '1'], self.info['NS'])
+
+                    # create an ip vlan on top of the mac vlan
+                    NetworkHelpers.ip_call(['link', 'add', 'link', _macvlan_name,
+                                            'name', _vlan_name, 'type', 'vlan', 'id', self.info['VLTAG']])
+
+                # add the addr on the vlan intf (BM case) or on the intf (VM case)
+                _intf_dev_to_use = _vlan_name or self.info['IFACE']
+                # the links to move and set up, lower one first
+                _links = (_macvlan_name, _vlan_name) if _macvlan_name else (_intf_dev_to_use,)
+
+                # move the iface(s) to the target namespace if requested
+                if self.ns is not None:
+                    for _link in _links:
+                        _logger.debug("%s link move %s", _link, self.ns)
+                        NetworkHelpers.ip_call(['link', 'set', 'dev', _link, 'netns', self.ns])
+        except Exception as e:
+            raise Exception('cannot set up links of interface %s' % self.info['IFACE']) from e
 
         # add IP address to interface
         if self.ns:
@@ -151,40 +201,25 @@ class NetworkInterfaceSetupHelper:
                           self.info['ADDR'], self.info['SBITS'], self.info['IFACE'], self.ns)
         else:
             _logger.debug("addr %s/%s add on %s", self.info['ADDR'], self.info['SBITS'], self.info['IFACE'])
-            _ip_cmd_prefix = ['/usr/sbin/ip']
-        if self.ns is not None:
-            _ip_cmd_prefix.extend(['netns', 'exec', self.ns, '/usr/sbin/ip'])
-
-        _ip_cmd = list(_ip_cmd_prefix)
-        _ip_cmd.extend(['addr', 'add', '%s/%s' % (self.info['ADDR'], self.info['SBITS']), 'dev', _intf_dev_to_use])
 
-        ret = sudo_utils.call(_ip_cmd)
-        if ret != 0:
+        try:
+            with NetworkHelpers.IpBatch(force=False):
+                NetworkHelpers.ip_call(['addr', 'add', '%s/%s' % (self.info['ADDR'], self.info['SBITS']),
+                                        'dev', _intf_dev_to_use], self.ns)
+
+                if self.ns is None and _macvlan_name is None \
+                        and NetworkHelpers.get_link_operstate(_intf_dev_to_use) == 'up' \
+                        and NetworkHelpers.get_link_mtu(_intf_dev_to_use) == NetworkInterfaceSetupHelper._INTF_MTU:
+                    # already set, nothing to do
+                    _logger.debug("%s already up", _intf_dev_to_use)
+                    _links = ()
+                _mtu = str(NetworkInterfaceSetupHelper._INTF_MTU)
+                for _link in _links:
+                    _logger.debug("%s set up", _link)
+                    NetworkHelpers.ip_call(['link', 'set', 'dev', _link, 'mtu', _mtu, 'up'], self.ns)
+        except Exception as e:
             raise Exception('cannot add IP address %s/%s on interface %s' %
-                            (self.info['ADDR'], self.info['SBITS'], self.info['IFACE']))
-
-        if _is_bm_shape and _macvlan_name:
-            _logger.debug("vlans set up")
-            _ip_cmd = list(_ip_cmd_prefix)
-            _ip_cmd.extend(['link', 'set', 'dev', _macvlan_name, 'mtu',
-                            str(NetworkInterfaceSetupHelper._INTF_MTU), 'up'])
-            ret = sudo_utils.call(_ip_cmd)
-            if ret != 0:
-                raise Exception("cannot set MAC VLAN %s up" % _macvlan_name)
-
-            _ip_cmd = list(_ip_cmd_prefix)
-            _ip_cmd.extend(['link', 'set', 'dev', _vlan_name, 'mtu', str(NetworkInterfaceSetupHelper._INTF_MTU), 'up'])
-            ret = sudo_utils.call(_ip_cmd)
-            if ret != 0:
-                raise Exception("cannot set VLAN %s up" % _vlan_name)
-        else:
-            _logger.debug("%s set up", self.info['IFACE'])
-            _ip_cmd = list(_ip_cmd_prefix)
-            _ip_cmd.extend(['link', 'set', 'dev', self.info['IFACE'], 'mtu',
-                            str(NetworkInterfaceSetupHelper._INTF_MTU), 'up'])
-            ret = sudo_utils.call(_ip_cmd)
-            if ret != 0:
-                raise Exception("cannot set interface $iface MTU" % self.info['IFACE'])
+                            (self.info['ADDR'], self.info['SBITS'], self.info['IFACE'])) from e
 
     def tear_down(self):
         """
@@ -194,16 +229,12 @@ class NetworkInterfaceSetupHelper:
         raises:
             Exception in case of error
         """
-        _ip_cmd = ['/usr/sbin/ip']
-        if self.info.has('NS'):
-            _ip_cmd.extend(['netns', 'exec', self.info['NS'], '/usr/sbin/ip'])
-
         if self.info.has('VLAN'):
             # delete vlan and macvlan, removes the addrs (pri and sec) as well
             _macvlan_name = "%s.%s" % (self.info['IFACE'], self.info['VLTAG'])
-            _ip_cmd.extend(['link', 'del', 'link', self.info['VLAN'], 'dev', _macvlan_name])
             _logger.debug('deleting macvlan [%s]', _macvlan_name)
-            ret = sudo_utils.call(_ip_cmd)
+            ret = NetworkHelpers.ip_call(['link', 'del', 'link', self.info['VLAN'], 'dev', _macvlan_name],
+                                         self.info.get('NS'))
             if ret != 0:
                 raise Exception("cannot remove VLAN %s" % self.info['VLTAG'])
         else:
@@ -211,10 +242,9 @@ class NetworkInterfaceSetupHelper:
                 # delete addr from phys iface
                 # deleting namespace will move phys iface back to main
                 # note that we may be deleting sec addr from a vlan here
-                _ip_cmd.extend(['addr', 'del', '%s/%s' % (self.info['ADDR'],
-                                                          self.info['SBITS']), 'dev', self.info['IFACE']])
                 _logger.debug('deleting interface [%s]', self.info['IFACE'])
-                ret = sudo_utils.call(_ip_cmd)
+                ret = NetworkHelpers.ip_call(['addr', 'del', '%s/%s' % (self.info['ADDR'], self.info['SBITS']),
+                                              'dev', self.info['IFACE']], self.info.get('NS'))
                 if ret != 0:
                     raise Exception("cannot remove ip address [%s] from %s" % (self.info['ADDR'], self.info['IFACE']))
                 NetworkHelpers.remove_ip_addr_rules(self.info['ADDR'])
@@ -233,11 +263,7 @@ class NetworkInterfaceSetupHelper:
         else:
             _dev = self.info['IFACE']
 
-        _ip_cmd = ['/usr/sbin/ip']
-        if self.info.has('NS'):
-            _ip_cmd.extend(['netns', 'exec', self.info['NS'], '/usr/sbin/ip'])
-        _ip_cmd.extend(['addr', 'add', '%s/32' % ip_address, 'dev', _dev])
-        ret = sudo_utils.call(_ip_cmd)
+        ret = NetworkHelpers.ip_call(['addr', 'add', '%s/32' % ip_address, 'dev', _dev], self.info.get('NS'))
         if ret != 0:
             raise Exception('Cannot add secondary address')
 
@@ -245,6 +271,7 @@ class NetworkInterfaceSetupHelper:
         """
         Remove and secondary ip address from this interface
         Remove it from VLAN or device according to this being VLANed or not
+        The removal is queued if a NetworkHelpers.IpBatch is active.
         parameter:
            ip_address: the IP to be removed as str
         raise:
@@ -256,10 +283,6 @@ class NetworkInterfaceSetupHelper:
         else:
             _dev = self.info['IFACE']
 
-        _ip_cmd = ['/usr/sbin/ip']
-        if self.info.has('NS'):
-            _ip_cmd.extend(['netns', 'exec', self.info['NS'], '/usr/sbin/ip'])
-        _ip_cmd.extend(['addr', 'del', '%s/32' % ip_address, 'dev', _dev])
-        ret = sudo_utils.call(_ip_cmd)
+        ret = NetworkHelpers.ip_call(['addr', 'del', '%s/32' % ip_address, 'dev', _dev], self.info.get('NS'))
         if ret != 0:
             raise Exception('Cannot remove secondary address')
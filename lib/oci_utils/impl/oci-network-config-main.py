@@ -770,13 +770,12 @@ def main():
 
     vnic_utils = VNICUtils()
 
-    if 'exclude' in args and args.exclude:
-        for exc in args.exclude:
-            vnic_utils.exclude(exc)
-
-    if 'include' in args and args.include:
-        for inc in args.include:
-            vnic_utils.include(inc)
+    if ('exclude' in args and args.exclude) or ('include' in args and args.include):
+        with vnic_utils.batched_save():
+            for exc in getattr(args, 'exclude', None) or ():
+                vnic_utils.exclude(exc)
+            for inc in getattr(args, 'include', None) or ():
+                vnic_utils.include(inc)
 
     if args.command == 'show':
         if args.compat_output:
@@ -7,37 +7,265 @@
 """ OS command line utils.
 """
 
+import atexit
+import errno
+import json
 import logging
+import os
+import select
+import shutil
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from . import (SUDO_CMD, CAT_CMD, RM_CMD, SH_CMD, CP_CMD, TOUCH_CMD, CHMOD_CMD, MKDIR_CMD)
 
-__all__ = ['call', 'call_output', 'execute', 'call_popen_output', 'delete_file', 'copy_file', 'write_to_file']
+__all__ = ['call', 'call_input', 'call_output', 'call_output_cached', 'call_many', 'invalidate', 'execute',
+           'call_popen_output', 'delete_file', 'copy_file', 'write_to_file']
 
 _logger = logging.getLogger('oci-utils.sudo')
 
+# call_output_cached() results: tuple(cmd) -> (expiry, output)
+_output_cache = {}
+_output_cache_lock = threading.Lock()
+
+# no need to go through sudo when already running as root.
+_NEEDS_SUDO = os.geteuid() != 0
+
+
+# set by _sudo_prefix() on first use.
+_sudo_cmd_prefix = None
+
+
+def _resolve_sudo_cmd():
+    """
+    Locate the sudo executable.
+
+    Returns
+    -------
+        str
+            SUDO_CMD if it is executable, else the sudo found in PATH, else
+            SUDO_CMD.
+    """
+    return shutil.which(SUDO_CMD) or shutil.which('sudo') or SUDO_CMD
+
+
+# absolute path of sudo, resolved once so exec does not search PATH.
+_sudo_cmd_abs = _resolve_sudo_cmd()
+
+
+def _retry_sudo(c, error):
+    """
+    Check if a command failed because sudo moved and locate it again.
+
+    Parameters
+    ----------
+    c: tuple
+        The prepared command line which failed.
+    error: OSError
+        The error raised when starting it.
+
+    Returns
+    -------
+        bool
+            True if sudo was found at a new place and the command should be
+            prepared and run again.
+    """
+    global _sudo_cmd_abs, _sudo_cmd_prefix
+    if error.errno != errno.ENOENT or c[0] != _sudo_cmd_abs:
+        return False
+    _new_path = shutil.which('sudo')
+    if _new_path is None or _new_path == _sudo_cmd_abs:
+        return False
+    _logger.debug('sudo moved from %s to %s', _sudo_cmd_abs, _new_path)
+    _sudo_cmd_abs = _new_path
+    _sudo_cmd_prefix = None
+    return True
+
+
+# privileged helper process, see _root_helper.py; False once it failed to start.
+_root_helper = None
+_root_helper_lock = threading.Lock()
+# seconds to wait for a reply of the root helper, its start included.
+_ROOT_HELPER_TIMEOUT = 10
+
+# os.posix_spawn() is available from python 3.8 on.
+_HAS_POSIX_SPAWN = hasattr(os, 'posix_spawn')
+
+
+def _sudo_prefix():
+    """
+    Get the sudo part of the command lines.
+
+    sudo is run non-interactively, relying on a cached credential: on first
+    use 'sudo -vn' validates (and refreshes) it. This needs either NOPASSWD
+    or a timestamp_timeout greater than 0 in sudoers; if the credential
+    cannot be validated without a password, plain sudo is used instead.
+
+    Returns
+    -------
+        tuple
+            The sudo command and its options.
+    """
+    global _sudo_cmd_prefix
+    if _sudo_cmd_prefix is None:
+        try:
+            _rc = subprocess.call([_sudo_cmd_abs, '-vn'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError:
+            _rc = 404
+        if _rc == 0:
+            _sudo_cmd_prefix = (_sudo_cmd_abs, '-n', '--')
+        else:
+            # expected with per-command NOPASSWD rules and the default verifypw=all, commands still run
+            _logger.debug('Cannot validate sudo credential without a password, sudo may prompt for it.')
+            _sudo_cmd_prefix = (_sudo_cmd_abs,)
+    return _sudo_cmd_prefix
+
+
+def _close_fds(c):
+    """
+    Check if subprocess must close the inherited file descriptors before
+    running a command.
+
+    sudo closes all file descriptors above stderr itself, with a single
+    closefrom() call, so there is no need for subprocess to close them one
+    by one beforehand.
+
+    Parameters
+    ----------
+    c: tuple
+        The prepared command line.
+
+    Returns
+    -------
+        bool
+            False if the command is run through sudo.
+    """
+    return c[0] not in (SUDO_CMD, _sudo_cmd_abs)
+
 
 def _prepare_command(cmd):
     """
-    Prepare the command line to be executed prepend sudo if not already present.
+    Prepare the command line to be executed prepend sudo if not already present
+    and not running as root.
 
     Parameters
     ----------
-    cmd : list
-        Command line as list of strings.
+    cmd : list or tuple
+        Command line as sequence of strings.
 
     Returns
     -------
-        list
+        tuple
             The prepared command.
     """
     assert (len(cmd) > 0), 'empty command list'
-    _cmd = []
-    if cmd[0] != SUDO_CMD:
-        _cmd.insert(0, SUDO_CMD)
-    _cmd.extend(cmd)
+    if not _NEEDS_SUDO or cmd[0] in (SUDO_CMD, _sudo_cmd_abs):
+        return tuple(cmd)
+    return (*(_sudo_cmd_prefix or _sudo_prefix()), *cmd)
+
+
+def _read_fd(fd):
+    """
+    Read a file descriptor until EOF.
+
+    Parameters
+    ----------
+    fd: int
+        The file descriptor.
+
+    Returns
+    -------
+        bytes
+            The data read.
+    """
+    _data = bytearray()
+    _chunk = os.read(fd, 65536)
+    while _chunk:
+        _data.extend(_chunk)
+        _chunk = os.read(fd, 65536)
+    return bytes(_data)
 
-    return _cmd
+
+def _write_fd(fd, data):
+    """
+    Write data to a file descriptor and close it.
+
+    Parameters
+    ----------
+    fd: int
+        The file descriptor.
+    data: bytes
+        The data to write.
+
+    Returns
+    -------
+        No return value.
+    """
+    try:
+        _view = memoryview(data)
+        while _view:
+            _view = _view[os.write(fd, _view):]
+    except OSError as e:
+        # the command exited without reading all of it
+        _logger.debug('cannot write command input: %s', str(e))
+    finally:
+        os.close(fd)
+
+
+def _spawn(cmd, data=None):
+    """
+    Run a command with posix_spawn(), sparing the page table copy of fork()
+    in the parent process.
+
+    Parameters
+    ----------
+    cmd: list
+        Command line as list of strings, cmd[0] is looked up in PATH if it
+        is not a path, as subprocess does.
+    data: bytes
+        The standard input of the command, if set; it is written from a
+        thread so that a command producing output before reading all of its
+        input cannot block on a full pipe.
+
+    Returns
+    -------
+        tuple
+            (exit code, stdout and stderr)
+    """
+    _r, _w = os.pipe()
+    _file_actions = [(os.POSIX_SPAWN_DUP2, _w, 1), (os.POSIX_SPAWN_DUP2, _w, 2)]
+    _in_r = _in_w = None
+    if data is not None:
+        _in_r, _in_w = os.pipe()
+        _file_actions.append((os.POSIX_SPAWN_DUP2, _in_r, 0))
+    try:
+        _pid = os.posix_spawnp(cmd[0], cmd, os.environ, file_actions=_file_actions)
+    except OSError:
+        os.close(_r)
+        if _in_w is not None:
+            os.close(_in_w)
+        raise
+    finally:
+        os.close(_w)
+        if _in_r is not None:
+            os.close(_in_r)
+    _writer = None
+    if _in_w is not None:
+        _writer = threading.Thread(target=_write_fd, args=(_in_w, data), name='spawn-stdin')
+        _writer.start()
+    try:
+        _output = _read_fd(_r)
+    finally:
+        os.close(_r)
+        if _writer is not None:
+            _writer.join()
+    _, _status = os.waitpid(_pid, 0)
+    if os.WIFEXITED(_status):
+        return os.WEXITSTATUS(_status), _output
+    return -os.WTERMSIG(_status), _output
 
 
 def execute(cmd):
@@ -53,6 +281,7 @@ def execute(cmd):
     -------
     (exit code, stdout, stderr)
     """
+    invalidate()
     _c = _prepare_command(cmd)
     if _logger.isEnabledFor(logging.DEBUG):
         _logger.debug('Executing [%s]', ' '.join(_c))
@@ -78,15 +307,63 @@ def call(cmd, log_output=True):
         int
             The command return code.
     """
+    invalidate()
     _c = _prepare_command(cmd)
     try:
         if _logger.isEnabledFor(logging.DEBUG):
             _logger.debug('Executing [%s]', ' '.join(_c))
-        cp = subprocess.run(_c, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-        if cp.returncode != 0 and log_output:
+        if _HAS_POSIX_SPAWN:
+            _rc, _output = _spawn(_c)
+            if _rc != 0 and log_output and _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("execution failed: ec=%s, output=[%s]", _rc, _output)
+            return _rc
+        cp = subprocess.run(_c, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False,
+                            close_fds=_close_fds(_c))
+        if cp.returncode != 0 and log_output and _logger.isEnabledFor(logging.DEBUG):
             _logger.debug("execution failed: ec=%s, output=[%s], stderr=[%s] ", cp.returncode, cp.stdout, cp.stderr)
         return cp.returncode
-    except OSError:
+    except OSError as e:
+        if _retry_sudo(_c, e):
+            return call(cmd, log_output)
+        return 404
+
+
+def call_input(cmd, content, log_output=True):
+    """
+    Execute a command, feeding it some content on its standard input.
+
+    Parameters
+    ----------
+    cmd: list
+        Command line as list of strings.
+    content: str
+        The standard input of the command.
+    log_output: bool
+        Write error messages to logfile if set.
+
+    Returns
+    -------
+        int
+            The command return code.
+    """
+    invalidate()
+    _c = _prepare_command(cmd)
+    try:
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug('Executing [%s]', ' '.join(_c))
+        if _HAS_POSIX_SPAWN:
+            _rc, _output = _spawn(_c, content.encode('utf-8'))
+            if _rc != 0 and log_output and _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("execution failed: ec=%s, output=[%s]", _rc, _output)
+            return _rc
+        cp = subprocess.run(_c, input=content.encode('utf-8'), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            check=False, close_fds=_close_fds(_c))
+        if cp.returncode != 0 and log_output and _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("execution failed: ec=%s, output=[%s], stderr=[%s] ", cp.returncode, cp.stdout, cp.stderr)
+        return cp.returncode
+    except OSError as e:
+        if _retry_sudo(_c, e):
+            return call_input(cmd, content, log_output)
         return 404
 
 
@@ -110,17 +387,128 @@ def call_output(cmd, log_output=True):
         None
             When command execution fails.
     """
+    _rc, _output = _call_rc_output(cmd, log_output)
+    if _rc == 404:
+        return 404
+    return _output
+
+
+def _call_rc_output(cmd, log_output=True):
+    """
+    Executes a command, collecting its return code and output.
+
+    Parameters
+    ----------
+    cmd: list
+        Command line as list of strings.
+    log_output: bool
+        Write error messages to logfile if set.
+
+    Returns
+    -------
+        tuple
+            (return code, stdout and stderr on success or None); the return
+            code is 404 on OSError.
+    """
     _c = _prepare_command(cmd)
     try:
-        return subprocess.check_output(_c, stderr=subprocess.STDOUT)
-    except OSError:
-        return 404
-    except subprocess.CalledProcessError as e:
-        if log_output:
-            if _logger.isEnabledFor(logging.DEBUG):
-                # pylint: disable=logging-not-lazy,logging-format-interpolation
-                _logger.debug("Error executing {}: {}\n{}\n".format(_c, e.returncode, e.output.decode('utf-8')))
-        return None
+        p = subprocess.Popen(_c, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0,
+                             close_fds=_close_fds(_c))
+    except OSError as e:
+        if _retry_sudo(_c, e):
+            return _call_rc_output(cmd, log_output)
+        return 404, None
+    with p.stdout:
+        _output = _read_fd(p.stdout.fileno())
+    if p.wait() != 0:
+        if log_output and _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Error executing %s: %s\n%s", _c, p.returncode, _output.decode('utf-8'))
+        return p.returncode, None
+    return 0, _output
+
+
+def call_many(cmds, max_workers=None, log_output=True):
+    """
+    Executes independent commands concurrently.
+
+    The commands must not depend on each other as there is no guarantee on
+    the order they run in.
+
+    Parameters
+    ----------
+    cmds: list
+        List of command lines, each one a list of strings.
+    max_workers: int
+        Maximum number of commands running at the same time, defaults to
+        min(8, len(cmds)).
+    log_output: bool
+        Write error messages to logfile if set.
+
+    Returns
+    -------
+        list
+            One (return code, output) tuple per command, in the order of
+            cmds; see _call_rc_output().
+    """
+    if not cmds:
+        return []
+    invalidate()
+    if max_workers is None:
+        max_workers = min(8, len(cmds))
+    with ThreadPoolExecutor(max_workers=max_workers) as _executor:
+        _futures = [_executor.submit(_call_rc_output, cmd, log_output) for cmd in cmds]
+    _results = []
+    for cmd, _future in zip(cmds, _futures):
+        try:
+            _results.append(_future.result())
+        except Exception as e:
+            _logger.debug('Error executing %s: %s', cmd, str(e))
+            _results.append((404, None))
+    return _results
+
+
+def call_output_cached(cmd, ttl=5.0, log_output=True):
+    """
+    Executes a read-only command, reusing the output of an identical call
+    made less than ttl seconds ago.
+
+    Only use this for commands which do not modify the system; the cache is
+    flushed by call(), execute() and write_to_file().
+
+    Parameters
+    ----------
+    cmd: list
+        Command line as list of strings.
+    ttl: float
+        Number of seconds a result stays valid.
+    log_output: bool
+        Write error messages to logfile if set.
+
+    Returns
+    -------
+        Same as call_output().
+    """
+    _key = tuple(cmd)
+    with _output_cache_lock:
+        _entry = _output_cache.get(_key)
+        if _entry is not None and _entry[0] > time.monotonic():
+            return _entry[1]
+    _output = call_output(cmd, log_output=log_output)
+    with _output_cache_lock:
+        _output_cache[_key] = (time.monotonic() + ttl, _output)
+    return _output
+
+
+def invalidate():
+    """
+    Flush the call_output_cached() results.
+
+    Returns
+    -------
+        No return value.
+    """
+    with _output_cache_lock:
+        _output_cache.clear()
 
 
 def call_popen_output(cmd, log_output=True):
@@ -145,17 +533,106 @@ def call_popen_output(cmd, log_output=True):
     """
     _c = _prepare_command(cmd)
     try:
-        p = subprocess.Popen(' '.join(_c), shell=True, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        return p.communicate()[0]
+        p = subprocess.Popen(_c, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=_close_fds(_c))
+        _out, _err = p.communicate()
     except OSError:
         return 404
-    except subprocess.CalledProcessError as e:
-        if log_output:
-            if _logger.isEnabledFor(logging.DEBUG):
-                # pylint: disable=logging-not-lazy,logging-format-interpolation
-                _logger.debug("Error executing {}: {}\n{}\n".format(_c, e.returncode, e.output))
+    if p.returncode != 0:
+        if log_output and _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Error executing %s: %s\n%s", _c, p.returncode, _err)
         return None
+    return _out
+
+
+def _stop_root_helper():
+    """
+    Close the root helper stdin, which makes it exit.
+
+    Returns
+    -------
+        No return value.
+    """
+    global _root_helper
+    with _root_helper_lock:
+        if _root_helper:
+            _root_helper.stdin.close()
+            _root_helper.wait()
+        _root_helper = None
+
+
+def _discard_root_helper():
+    """
+    Stop a root helper which failed, the caller holds _root_helper_lock.
+    sudo relays SIGTERM to the helper; SIGKILL, used as last resort, only
+    stops sudo.
+
+    Returns
+    -------
+        No return value.
+    """
+    global _root_helper
+    _helper, _root_helper = _root_helper, False
+    try:
+        _helper.stdin.close()
+    except OSError:
+        pass
+    for _stop in (_helper.terminate, _helper.kill):
+        try:
+            _stop()
+            _helper.wait(timeout=_ROOT_HELPER_TIMEOUT)
+            return
+        except OSError as e:
+            _logger.debug('Cannot stop root helper: %s', str(e))
+        except subprocess.TimeoutExpired:
+            pass
+    _logger.debug('Root helper [%s] did not stop', _helper.pid)
+
+
+def _send_to_helper(request):
+    """
+    Send a request to the root helper, starting it on first use. When
+    already running as root the request is served in process.
+
+    Parameters
+    ----------
+    request: dict
+        The request, e.g. {'op': 'unlink', 'path': '/some/file'}.
+
+    Returns
+    -------
+        int
+            The return code of the operation, None if the helper is not
+            available.
+    """
+    global _root_helper
+    if not _NEEDS_SUDO:
+        from . import _root_helper as _in_process
+        return _in_process._OPS[request['op']](request['path'])
+    with _root_helper_lock:
+        if _root_helper is None:
+            _helper = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_root_helper.py')
+            try:
+                _root_helper = subprocess.Popen([_sudo_cmd_abs, '-n', sys.executable, _helper],
+                                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                stderr=subprocess.DEVNULL, universal_newlines=True)
+                atexit.register(_stop_root_helper)
+            except OSError as e:
+                _logger.debug('Cannot start root helper: %s', str(e))
+                _root_helper = False
+        if not _root_helper:
+            return None
+        try:
+            _root_helper.stdin.write(json.dumps(request) + '\n')
+            _root_helper.stdin.flush()
+            # one reply line per request: nothing is left buffered from a previous one
+            if not select.select([_root_helper.stdout], [], [], _ROOT_HELPER_TIMEOUT)[0]:
+                raise OSError(errno.ETIMEDOUT, 'no reply within %s seconds' % _ROOT_HELPER_TIMEOUT)
+            _reply = _root_helper.stdout.readline()
+            return json.loads(_reply)['rc']
+        except (OSError, ValueError, KeyError) as e:
+            _logger.debug('Root helper failed: %s', str(e))
+            _discard_root_helper()
+            return None
 
 
 def create_dir(path):
@@ -187,7 +664,11 @@ def delete_file(path):
     -------
         The return code fo the delete command.
     """
-    return call([RM_CMD, '-f', path])
+    invalidate()
+    _rc = _send_to_helper({'op': 'unlink', 'path': path})
+    if _rc is None:
+        return call([RM_CMD, '-f', path])
+    return _rc
 
 
 def copy_file(path, newpath):
@@ -222,7 +703,7 @@ def write_to_file(path, content):
     -------
         The return code fo the cat(1) command.
     """
-
+    invalidate()
     _c = _prepare_command([SH_CMD, '-c', '%s > %s' % (CAT_CMD, path)])
     (_, err) = subprocess.Popen(_c,
                                 stdout=subprocess.PIPE,
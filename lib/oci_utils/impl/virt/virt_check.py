@@ -14,6 +14,7 @@ Verify if we have valid KVM environment on a BM with the following
 
 import logging
 import os
+import re
 
 from oci_utils import lsblk
 from . import virt_utils
@@ -35,10 +36,9 @@ def iommu_check():
         bool
             True on success, False otherwise.
     """
-    iommu_enabled_exp = "IOMMU.*enabled"
-    output = sudo_utils.call_popen_output(
-        ['/bin/dmesg', '|', 'egrep', '"{}"'.format(iommu_enabled_exp)])
-    if not output:
+    iommu_enabled_exp = re.compile(r'IOMMU.*enabled')
+    output = sudo_utils.call_popen_output(['/bin/dmesg'])
+    if not output or not iommu_enabled_exp.search(output.decode('utf-8', errors='replace')):
         _logger.debug('IOMMU flag not set on kernel')
         return False
     return True
@@ -68,7 +68,7 @@ def sriov_numvfs_check(phys_dev):
         _logger.debug('sriov_numvfs_check return false')
         return False
     except IOError as e:
-        _logger.debug('error checking sriov_numvfs_check: %s' % str(e))
+        _logger.debug('error checking sriov_numvfs_check: %s', str(e))
         return False
 
 
@@ -88,10 +88,10 @@ def br_link_mode_check(phys_dev):
     """
     vepa = "VEPA"
     res = sudo_utils.call_popen_output(
-        [BRIDGE_CMD, 'link', 'show', 'dev', '"{}"'.format(phys_dev)])
+        [BRIDGE_CMD, 'link', 'show', 'dev', phys_dev])
     if res and vepa == res.split()[-1].decode().upper():
         return True
-    _logger.debug('br_link_mode_check, return False, server_type: %s ' % vepa)
+    _logger.debug('br_link_mode_check, return False, server_type: %s ', vepa)
     return False
 
 
@@ -187,7 +187,7 @@ def validate_block_device(dev_orig):
     try:
         os.stat(dev)
     except Exception:
-        _logger.error("{} does not exist.".format(dev))
+        _logger.error("%s does not exist.", dev)
         _print_available_block_devices(unused_devices)
         return False
 
@@ -206,14 +206,14 @@ def validate_block_device(dev_orig):
                 if e.errno == 22:
                     break
                 _logger.error(
-                        "Unexpected error occured while resolving {}.  Error "
-                        "reading {}: {}",
+                        "Unexpected error occured while resolving %s.  Error "
+                        "reading %s: %s",
                         dev_orig, dev, e)
                 return False
 
             # Prevent infinite loops
             if dev in visited:
-                _logger.error("Infinite loop encountered trying to resolve {}.",
+                _logger.error("Infinite loop encountered trying to resolve %s.",
                             dev_orig)
                 print_choices("Path:", visited + [dev])
                 return False
@@ -225,7 +225,7 @@ def validate_block_device(dev_orig):
         try:
             dev = dev_map[dev]
         except Exception:
-            _logger.error("{} does not point to a block device.", dev_orig)
+            _logger.error("%s does not point to a block device.", dev_orig)
             _print_available_block_devices(unused_devices)
             return False
 
@@ -235,21 +235,21 @@ def validate_block_device(dev_orig):
     dev_path = os.readlink(dev)
     dev_name = dev_path[dev_path.rfind('/') + 1:]
     if dev_name not in devices:
-        _logger.error("{} is not a valid device", dev_orig)
+        _logger.error("%s is not a valid device", dev_orig)
         _print_available_block_devices(unused_devices)
         return False
     if virt_utils.block_device_has_mounts(devices[dev_name]):
-        _logger.error("{} is in use by the host system", dev_orig)
+        _logger.error("%s is in use by the host system", dev_orig)
         _print_available_block_devices(unused_devices)
         return False
     if not devices[dev_name].get('size'):
-        _logger.error("{} is not a disk", dev_orig)
+        _logger.error("%s is not a disk", dev_orig)
         _print_available_block_devices(unused_devices)
         return False
 
     for domain, disks in domain_disks.items():
         if dev in disks:
-            _logger.error("{} is in use by \"{}\"", dev_orig, domain)
+            _logger.error("%s is in use by \"%s\"", dev_orig, domain)
             _print_available_block_devices(unused_devices)
             return False
 
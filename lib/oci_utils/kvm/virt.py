@@ -154,13 +154,13 @@ def find_unassigned_vf_by_phys(phys, domain_interfaces, desired_mac, vfs_blackli
     _logger.debug('find_unassigned_vf_by_phys called for (phys=%s,domain_interfaces=%s,desired_mac=%s,blacklist=%s)' %
                   (phys, domain_interfaces, desired_mac, vfs_blacklist))
     configured = sysconfig.read_network_config()
-    _logger.debug('configured interfaces are : %s' % configured)
+    _logger.debug('configured interfaces are : %s', configured)
     ifaces = get_interfaces()
-    _logger.debug('all interfaces are : %s' % ifaces)
+    _logger.debug('all interfaces are : %s', ifaces)
     virt_fns = ifaces[phys].get('virtfns', {})
-    _logger.debug('virt_fns for given phys  : %s' % virt_fns)
+    _logger.debug('virt_fns for given phys  : %s', virt_fns)
     vfs = {virt_fns[v]['mac']: (virt_fns[v]['pci_id'], v) for v in virt_fns}
-    _logger.debug('vfs for given phys  : %s' % vfs)
+    _logger.debug('vfs for given phys  : %s', vfs)
 
     # First, remove entries where the mac address is configured via sysconfig
     for c in configured:
@@ -172,11 +172,11 @@ def find_unassigned_vf_by_phys(phys, domain_interfaces, desired_mac, vfs_blackli
             # Configured interfaces with zero as a mac address are almost
             # certainly loopback interfaces of some variety.  Not suitable
             # for a VM to use.
-            _logger.debug('discard [%s] because mac == "00:00:00:00:00:00"' % str(c))
+            _logger.debug('discard [%s] because mac == "00:00:00:00:00:00"', str(c))
             continue
         vf = vfs.get(mac)
         if vf:
-            _logger.debug('configured - discard vfs[%s] = %s' % (mac, vfs[mac]))
+            _logger.debug('configured - discard vfs[%s] = %s', mac, vfs[mac])
             del vfs[mac]
 
     # Next, remove entries where the mac address is already in use manually
@@ -184,12 +184,12 @@ def find_unassigned_vf_by_phys(phys, domain_interfaces, desired_mac, vfs_blackli
         for mac in i:
             vf = vfs.get(mac)
             if vf:
-                _logger.debug('mac found for domain %s domain_interfaces - discard vfs[%s] = %s' % (d, mac, vfs[mac]))
+                _logger.debug('mac found for domain %s domain_interfaces - discard vfs[%s] = %s', d, mac, vfs[mac])
                 del vfs[mac]
     _to_be_deleted = []
     for mac in vfs.keys():
         if vfs[mac] in vfs_blacklist:
-            _logger.debug('VFs found in black list - discard vfs[%s] = %s' % (mac, vfs[mac]))
+            _logger.debug('VFs found in black list - discard vfs[%s] = %s', mac, vfs[mac])
             _to_be_deleted.append(mac)
 
     for _m in _to_be_deleted:
@@ -202,7 +202,7 @@ def find_unassigned_vf_by_phys(phys, domain_interfaces, desired_mac, vfs_blackli
     prev = vfs.get(desired_mac)
     if prev:
         return prev
-    _logger.debug('post treatment, vfs = [%s], returning first one' % str(vfs.values()))
+    _logger.debug('post treatment, vfs = [%s], returning first one', str(vfs.values()))
     return list(vfs.values())[0]
 
 
@@ -312,9 +312,9 @@ def test_vnic_and_assign_vf(ip_addr, free_vnics_ips, backlisted_vfs=()):
             The virtual network interface, the pci id, the virtual function
             id on success, False,False,False otherwise.
     """
-    _logger.debug('test_vnic_and_assign_vf called with (%s,%s,%s)' % (ip_addr, free_vnics_ips, backlisted_vfs))
-    vnics = InstanceMetadata().refresh()['vnics']
-    _logger.debug('vnics found in metadata: %s' % vnics)
+    _logger.debug('test_vnic_and_assign_vf called with (%s,%s,%s)', ip_addr, free_vnics_ips, backlisted_vfs)
+    vnics = InstanceMetadata()['vnics']
+    _logger.debug('vnics found in metadata: %s', vnics)
     domains = virt_utils.get_domains_name()
     domain_interfaces = {d: virt_utils.get_interfaces_from_domain(
         virt_utils.get_domain_xml(d)) for d in domains}
@@ -322,27 +322,27 @@ def test_vnic_and_assign_vf(ip_addr, free_vnics_ips, backlisted_vfs=()):
     # First see if the given ip address belongs to a vnic
     vnic = find_vnic_by_ip(ip_addr, vnics)
     if vnic is None:
-        _logger.error("{} is not the IP address of a VNIC.", ip_addr)
+        _logger.error("%s is not the IP address of a VNIC.", ip_addr)
         _print_available_vnics(free_vnics_ips)
         return False, False, False
 
-    _logger.debug('vnic found from IP : %s' % vnic)
+    _logger.debug('vnic found from IP : %s', vnic)
 
     # Next check that the ip address is not already assigned to a vm
     vnic_mac = vnic['macAddr'].lower()
-    _logger.debug('vnic found mac is %s' % vnic_mac)
+    _logger.debug('vnic found mac is %s', vnic_mac)
     dom = _find_vlan(vnic_mac, domain_interfaces)
     if dom:
-        _logger.error("{} is in use by \"{}\".", ip_addr, dom)
+        _logger.error("%s is in use by \"%s\".", ip_addr, dom)
         _print_available_vnics(free_vnics_ips)
         return False, False, False
 
     phys_nic = get_phys_by_index(vnic, vnics, get_interfaces())
-    _logger.debug('physical intf found by index  : %s' % phys_nic)
+    _logger.debug('physical intf found by index  : %s', phys_nic)
 
     vf_pci_id, vf_num = find_unassigned_vf_by_phys(phys_nic, domain_interfaces,
                                                    vnic_mac, backlisted_vfs)
-    _logger.debug('VF PCI id found [%s] VF number [%s]' % (vf_pci_id, vf_num))
+    _logger.debug('VF PCI id found [%s] VF number [%s]', vf_pci_id, vf_num)
     if vf_pci_id is None:
         # This should never happen.  There are always at least as many virtual
         # Functions as there are potential creatable vnics
@@ -520,15 +520,15 @@ def create(**kargs):
     """
 
     try:
-        _metadata = InstanceMetadata().refresh()
+        _metadata = InstanceMetadata()
     except IOError as e:
-        _logger.error("Cannot fetch instance metadata: %s" % str(e))
+        _logger.error("Cannot fetch instance metadata: %s", str(e))
         return 1
 
     _instance_shape = _metadata['instance']['shape']
     _is_bm_shape = _instance_shape.startswith('BM')
 
-    _logger.debug('instance shape is [%s]' % _instance_shape)
+    _logger.debug('instance shape is [%s]', _instance_shape)
 
     if not virt_check.validate_kvm_env(_is_bm_shape):
         _logger.error("Server does not have supported environment "
@@ -536,10 +536,10 @@ def create(**kargs):
         return 1
 
     if not virt_check.validate_domain_name(kargs['name']):
-        _logger.error("Domain name \"{}\" is already in use.".format(kargs['name']))
+        _logger.error("Domain name \"%s\" is already in use.", kargs['name'])
         return 1
 
-    _logger.debug('domain name to use [%s]' % kargs['name'])
+    _logger.debug('domain name to use [%s]', kargs['name'])
 
     if kargs['root_disk']:
         _root_disk = virt_check.validate_block_device(kargs['root_disk'])
@@ -558,7 +558,7 @@ def create(**kargs):
                  '--disk', _disk_virt_install_args])
 
     if _logger.isEnabledFor(logging.DEBUG):
-        _logger.debug('virt-install command [%s]' % ' '.join(args))
+        _logger.debug('virt-install command [%s]', ' '.join(args))
 
     if kargs['virtual_network']:
         for vn_name in kargs['virtual_network']:
@@ -569,13 +569,13 @@ def create(**kargs):
         if _logger.isEnabledFor(logging.DEBUG):
             _logger.debug('vnics found')
             for _v in vnics:
-                _logger.debug('  [%s]' % str(_v))
+                _logger.debug('  [%s]', str(_v))
 
         interfaces = get_interfaces()
         if _logger.isEnabledFor(logging.DEBUG):
             for _i in interfaces:
-                _logger.debug('interface [%s]' % _i)
-                _logger.debug('  [%s]' % str(interfaces[_i]))
+                _logger.debug('interface [%s]', _i)
+                _logger.debug('  [%s]', str(interfaces[_i]))
 
         if _is_bm_shape:
             # sanity : verify primary vnic is not specified
@@ -588,21 +588,21 @@ def create(**kargs):
             args.append('--hvm')
             free_vnic_ip_addrs = []
             free_vnics = find_free_vnics(vnics, interfaces)
-            _logger.debug('free vnics ips : %s' % str(free_vnics))
+            _logger.debug('free vnics ips : %s', str(free_vnics))
             if not kargs['network']:
                 try:
                     free_vnic_ip_addrs.append(free_vnics.pop())
-                    _logger.debug('no network option specified, taking the first one: %s' % free_vnic_ip_addrs)
+                    _logger.debug('no network option specified, taking the first one: %s', free_vnic_ip_addrs)
                 except KeyError:
                     _print_available_vnics(free_vnics)
                     return 1
             else:
-                _logger.debug('network option specified:  %s' % kargs['network'])
+                _logger.debug('network option specified:  %s', kargs['network'])
                 free_vnic_ip_addrs = kargs['network']
 
             _blacklisted_vfs = []
             for free_vnic_ip_addr in free_vnic_ip_addrs:
-                _logger.debug('checking vnic [%s] and find VF' % free_vnic_ip_addr)
+                _logger.debug('checking vnic [%s] and find VF', free_vnic_ip_addr)
                 vnic, vf, vf_num = test_vnic_and_assign_vf(free_vnic_ip_addr, free_vnics, _blacklisted_vfs)
                 if not vnic:
                     return 1
@@ -610,7 +610,7 @@ def create(**kargs):
                 _blacklisted_vfs.append((vf, vf_num))
 
                 vf_dev = get_interface_by_pci_id(vf, interfaces)
-                _logger.debug('VF dev found %s' % vf_dev)
+                _logger.debug('VF dev found %s', vf_dev)
                 if not create_networking(vf_dev, vnic['vlanTag'], vnic['macAddr']):
                     _logger.debug('networking creation has failed')
                     destroy_networking(vf_dev, vnic['vlanTag'])
@@ -635,7 +635,7 @@ def create(**kargs):
                         if intf_name == vn_name:
                             _mac_to_use = intf_info['mac'].upper()
                     if _mac_to_use is None:
-                        _logger.error('Cannot find MAC address for %s' % vn_name)
+                        _logger.error('Cannot find MAC address for %s', vn_name)
                         return 1
                     if _mac_to_use == primary_mac:
                         _logger.error('primary vNIC must not be selected')
@@ -648,21 +648,21 @@ def create(**kargs):
                 # and not the primary one. the VNICs returned by metadata service is sorted list
                 # i.e the first one is the primary VNICs
                 domains_nics = _get_intf_used_by_guest()
-                _logger.debug('NICs used by domains [%s]' % domains_nics)
+                _logger.debug('NICs used by domains [%s]', domains_nics)
                 intf_to_use = None
                 _mac_to_use = None
                 for intf_name, intf_info in interfaces.items():
                     # skip non physical intf
                     if not intf_info['physical']:
-                        _logger.debug('skipping physical [%s]' % intf_info)
+                        _logger.debug('skipping physical [%s]', intf_info)
                         continue
                     # if used by a guest, skip it
                     if intf_name in [list(m.values())[0] for m in list(domains_nics.values())]:
-                        _logger.debug('skipping used by guest [%s]' % intf_name)
+                        _logger.debug('skipping used by guest [%s]', intf_name)
                         continue
                     # if primary one (primary VNIC), skip it
                     if vnics[0]['macAddr'].upper() == intf_info['mac'].upper():
-                        _logger.debug('skipping primary [%s]' % intf_info)
+                        _logger.debug('skipping primary [%s]', intf_info)
                         continue
                     # we've found one
                     intf_to_use = intf_name
@@ -685,18 +685,18 @@ def create(**kargs):
               "'virsh console {}'".format(kargs['name']))
 
     if _logger.isEnabledFor(logging.DEBUG):
-        _logger.debug('create: executing [%s]' % ' '.join(args))
+        _logger.debug('create: executing [%s]', ' '.join(args))
 
     virt_install = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     _logger.debug('Waiting for virt-install process to terminate')
     (_out, _err) = virt_install.communicate()
     _logger.debug('virt-install process terminated')
     if virt_install.returncode != 0:
-        _logger.error('Creation failed: %s' % _err.decode('utf-8'))
+        _logger.error('Creation failed: %s', _err.decode('utf-8'))
         if _is_bm_shape and not kargs['virtual_network']:
             destroy_networking(vf_dev, vnic['vlanTag'])
         return 1
-    _logger.debug('Creation succeed: %s' % _out)
+    _logger.debug('Creation succeed: %s', _out)
     return 0
 
 
@@ -748,10 +748,10 @@ def destroy(name, delete_disks):
         if len(net_intfs) > 0:
             vnet = net_intfs[0].findall('source')[0].get('network')
             if vnet:
-                _logger.debug('destroy: use of virtual network [%s] detected' % vnet)
+                _logger.debug('destroy: use of virtual network [%s] detected', vnet)
                 _use_virtual_network = True
     except libvirt.libvirtError as e:
-        _logger.error('Failed to get domain information: %s' % e.get_error_message())
+        _logger.error('Failed to get domain information: %s', e.get_error_message())
         libvirtConn.close()
         return 1
 
@@ -768,13 +768,13 @@ def destroy(name, delete_disks):
                     if file_as_source:
                         _vol = virt_utils.find_storage_pool_volume_by_path(libvirtConn, file_as_source)
                         if _vol:
-                            _logger.debug('libvirt volume found [%s]' % _vol.name())
+                            _logger.debug('libvirt volume found [%s]', _vol.name())
                             try:
                                 _vol.wipe(0)
                                 _vol.delete(0)
                                 _logger.debug('libvirt volume deleted')
                             except libvirt.libvirtError as e:
-                                _logger.error('Cannot delete volume [%s]: %s' % (_vol.name(), str(e)))
+                                _logger.error('Cannot delete volume [%s]: %s', _vol.name(), str(e))
 
     libvirtConn.close()
 
@@ -823,7 +823,7 @@ def create_netfs_pool(netfs_server, resource_path, name):
         pool.create()
     except libvirt.libvirtError as e:
         pool.undefine()
-        _logger.error('Failed to setup the pool: %s' % e.get_error_message())
+        _logger.error('Failed to setup the pool: %s', e.get_error_message())
         return 1
     finally:
         conn.close()
@@ -915,9 +915,9 @@ def create_virtual_network(**kargs):
         0 on success , 1 otherwise
     """
     try:
-        _metadata = InstanceMetadata().refresh()
+        _metadata = InstanceMetadata()
     except IOError as e:
-        _logger.error("Cannot fetch instance metadata: %s" % str(e))
+        _logger.error("Cannot fetch instance metadata: %s", str(e))
         return 1
 
     _instance_shape = _metadata['instance']['shape']
@@ -926,7 +926,7 @@ def create_virtual_network(**kargs):
     # get the given IP used to find vNIC to use
     _vnic_ip_to_use = kargs['network']
 
-    _logger.debug('in create_virtual_network, given IP : %s ' % _vnic_ip_to_use)
+    _logger.debug('in create_virtual_network, given IP : %s ', _vnic_ip_to_use)
 
     # get all vNIC of the current system
     _all_vnics = _metadata['vnics']
@@ -944,10 +944,10 @@ def create_virtual_network(**kargs):
         if not vnic:
             _logger.debug('choosen vNIC is not free')
             return 1
-        _logger.debug('ready to write network configuration for (%s, %s, %s)' % (vnic, vf, vf_num))
+        _logger.debug('ready to write network configuration for (%s, %s, %s)', vnic, vf, vf_num)
 
         vf_dev = get_interface_by_pci_id(vf, _all_system_interfaces)
-        _logger.debug('vf device for %s: %s' % (vf, vf_dev))
+        _logger.debug('vf device for %s: %s', vf, vf_dev)
         if not create_networking(vf_dev,
                                  vnic['vlanTag'],
                                  vnic['macAddr'],
@@ -965,16 +965,16 @@ def create_virtual_network(**kargs):
                 vnic = v
                 break
         if vnic is None:
-            _logger.error('vNIC with address [%s] not found' % _vnic_ip_to_use)
+            _logger.error('vNIC with address [%s] not found', _vnic_ip_to_use)
             return None
         for intf_name, attrs in _all_system_interfaces.items():
             if attrs['mac'].upper() == vnic['macAddr'].upper() and attrs['physical']:
                 vf_dev = intf_name
         if vf_dev is None:
-            _logger.error('cannot find network interface matching vNIC with ip [%s]' % _vnic_ip_to_use)
+            _logger.error('cannot find network interface matching vNIC with ip [%s]', _vnic_ip_to_use)
             return 1
 
-        _logger.debug(' device for nework %s' % vf_dev)
+        _logger.debug(' device for nework %s', vf_dev)
 
         if not create_networking(vf_dev,
                                  None,
@@ -988,7 +988,7 @@ def create_virtual_network(**kargs):
     _logger.debug('Networking succesfully created')
 
     # define a routing table for the new VF.
-    _logger.debug('add new routing table [%s]' % vf_dev)
+    _logger.debug('add new routing table [%s]', vf_dev)
     add_route_table(vf_dev)
 
     # deduce KVMnetwork
@@ -1022,7 +1022,7 @@ def create_virtual_network(**kargs):
     dhcp = SubElement(ip, 'dhcp')
     SubElement(dhcp, 'range', start=kargs['ip_start'], end=kargs['ip_end'])
 
-    _logger.debug('defining network as [%s]' % ElementTree.tostring(netXML))
+    _logger.debug('defining network as [%s]', ElementTree.tostring(netXML))
 
     tf = tempfile.NamedTemporaryFile(mode='w', delete=False)
     os.chmod(tf.name, 0o644)
@@ -1031,7 +1031,7 @@ def create_virtual_network(**kargs):
 
     (code, _, stderr) = sudo_utils.execute([VIRSH_CMD, '--quiet', 'net-define', tf.name])
     if code != 0:
-        _logger.error('Failed to define the network: %s' % stderr)
+        _logger.error('Failed to define the network: %s', stderr)
         os.remove(tf.name)
         delete_route_table(vf_dev)
         destroy_networking(vf_dev, vnic['vlanTag'])
@@ -1044,7 +1044,7 @@ def create_virtual_network(**kargs):
     try:
         kvm_sysd_svc.generate()
     except Exception as e:
-        _logger.error('Failed to generate the init script : %s' % str(e))
+        _logger.error('Failed to generate the init script : %s', str(e))
         delete_route_table(vf_dev)
         destroy_networking(vf_dev, vnic['vlanTag'])
         return 1
@@ -1075,13 +1075,13 @@ def delete_virtual_network(**kargs):
     """
     libvirtConn = libvirt.open(None)
     if libvirtConn is None:
-        _logger.error('Cannot find network named [%s]' % kargs['network_name'])
+        _logger.error('Cannot find network named [%s]', kargs['network_name'])
         return 1
     net = None
     try:
         net = libvirtConn.networkLookupByName(kargs['network_name'])
     except libvirt.libvirtError:
-        _logger.error('Cannot find network named [%s]' % kargs['network_name'])
+        _logger.error('Cannot find network named [%s]', kargs['network_name'])
         return 1
 
     root = ElementTree.fromstring(net.XMLDesc())
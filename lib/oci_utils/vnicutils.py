@@ -4,18 +4,53 @@
 # Licensed under the Universal Permissive License v 1.0 as shown
 # at http://oss.oracle.com/licenses/upl.
 
+import collections
+import copy
+import functools
+import ipaddress
 import logging
 import os
 import os.path
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from .oci_api import OCISession
+from . import _configuration as OCIUtilsConfiguration
 from . import cache
 from .metadata import InstanceMetadata
 from .impl import network_helpers as NetworkHelpers
 from .impl.network_interface import NetworkInterfaceSetupHelper, _intf_dict
-from .impl import sudo_utils
 
 _logger = logging.getLogger('oci-utils.vnicutils')
 
+# link flags of the system interfaces ignored by get_network_config()
+_FLAGS_SKIP = frozenset(('NO-CARRIER', 'LOOPBACK'))
+
+# the interfaces are configured concurrently, by up to that many threads
+_CONFIG_MAX_WORKERS = 8
+# serializes the namespace existence check and creation
+_netns_lock = threading.Lock()
+# VNICUtils instance metadata not fetched yet
+_METADATA_NOT_FETCHED = object()
+
+
+def _invalidates_network_config(func):
+    """
+    Decorator for the VNICUtils methods changing the network configuration
+    or the vnic_info: drops the get_network_config() cache on entry and on
+    exit, so that a get_network_config() call within an operation (e.g.
+    auto_config()) is done once and reused until something changes.
+    """
+    @functools.wraps(func)
+    def _wrapper(self, *args, **kwargs):
+        self._netcfg_cache = None
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self._netcfg_cache = None
+    return _wrapper
+
 
 class VNICUtils:
     """Class for managing VNICs
@@ -25,17 +60,108 @@ class VNICUtils:
     # OBSOLETE: file with VNICs and stuff to exclude from automatic
     # configuration. only kept for migration
     __net_exclude_file = "/var/lib/oci-utils/net_exclude"
-
-    def __init__(self):
+    # how long (in seconds) get_network_config() result is reused
+    _NETCFG_CACHE_TTL = 5.0
+    # instance metadata shared by the VNICUtils instances of the process
+    # and how long (in seconds) they are reused
+    _metadata_cache = None
+    _metadata_cache_ts = 0.0
+    _METADATA_CACHE_TTL = 60.0
+
+    def __init__(self, metadata=None, force_refresh=False):
         """ Class VNICUtils initialisation.
+
+        Parameters
+        ----------
+        metadata: InstanceMetadata
+            The instance metadata to use, fetched (or reused) on first use
+            if not set: the vnic_info only consumers never fetch them.
+        force_refresh: bool
+            Fetch the metadata even if recently fetched ones are available.
         """
+        # when set, save_vnic_info() is deferred, see batched_save()
+        self._batched = False
+        # (monotonic time, include_private_ips, interfaces) of the last get_network_config()
+        self._netcfg_cache = None
+        # (monotonic time, private IPs by vnic) of the last _get_priv_addrs()
+        self._priv_addrs_cache = None
         self.vnic_info = self.get_vnic_info()
         _logger.debug('_GT_ vnic_info %s', self.vnic_info)
-        self._metadata = None
+        self._force_refresh = force_refresh
+        self.__metadata = metadata if metadata is not None else _METADATA_NOT_FETCHED
+
+    @property
+    def _metadata(self):
+        """
+        The instance metadata, fetched on first use.
+
+        Returns
+        -------
+            InstanceMetadata
+                The metadata or None if they cannot be fetched.
+        """
+        if self.__metadata is _METADATA_NOT_FETCHED:
+            self.__metadata = VNICUtils._get_metadata(self._force_refresh)
+        return self.__metadata
+
+    def _is_bm(self):
+        """
+        Checks if this instance is a bare metal one, from the metadata of this
+        VNICUtils (injected or fetched) rather than from new ones.
+
+        Returns
+        -------
+            bool
+                True if the instance shape is a BM one, False if unknown.
+        """
+        try:
+            return self._metadata['instance']['shape'].startswith('BM')
+        except (KeyError, TypeError):
+            # no metadata, or partial ones
+            return False
+
+    def _metadata_vnics(self):
+        """
+        The VNICs of the metadata of this VNICUtils. InstanceMetadata has no
+        dict-like get(key), a missing key is caught instead.
+
+        Returns
+        -------
+            list
+                The VNICs, empty if there are no metadata or no vnics key.
+        """
         try:
-            self._metadata = InstanceMetadata().refresh()
-        except IOError as e:
-            _logger.warning('Cannot get metadata: %s', str(e))
+            return self._metadata['vnics'] or []
+        except (KeyError, TypeError):
+            return []
+
+    @staticmethod
+    def _get_metadata(force_refresh=False):
+        """
+        Get the instance metadata, reusing the ones fetched by a previous
+        instance for _METADATA_CACHE_TTL seconds.
+
+        Parameters
+        ----------
+        force_refresh: bool
+            Fetch the metadata even if recently fetched ones are available.
+
+        Returns
+        -------
+            InstanceMetadata
+                The metadata or None if they cannot be fetched.
+        """
+        _now = time.monotonic()
+        if force_refresh or VNICUtils._metadata_cache is None \
+                or _now - VNICUtils._metadata_cache_ts >= VNICUtils._METADATA_CACHE_TTL:
+            try:
+                # the constructor already fetches the metadata
+                VNICUtils._metadata_cache = InstanceMetadata()
+                VNICUtils._metadata_cache_ts = _now
+            except IOError as e:
+                _logger.warning('Cannot get metadata: %s', str(e))
+                return None
+        return VNICUtils._metadata_cache
 
     @staticmethod
     def __new_vnic_info():
@@ -44,21 +170,25 @@ class VNICUtils:
 
         Returns
         -------
-        tuple
-            (vnic info timestamp: datetime, vnic info: dict)
+        dict
+            The vnic info.
         """
         _vnic_info = {
             'exclude': []}
 
-        # migration from oci-utils 0.5's net_exclude file
+        # migration from oci-utils 0.5's net_exclude file, nothing to write if there is none.
+        if not os.path.exists(VNICUtils.__net_exclude_file):
+            return _vnic_info
         excludes = cache.load_cache(VNICUtils.__net_exclude_file)[1]
         if excludes is not None:
             _vnic_info['exclude'] = excludes
+            # the net_exclude file is removed right after: make sure its content is on disk first
             cache.write_cache(cache_content=_vnic_info,
-                              cache_fname=VNICUtils.__vnic_info_file)
+                              cache_fname=VNICUtils.__vnic_info_file,
+                              durability='sync')
             try:
                 os.remove(VNICUtils.__net_exclude_file)
-            except Exception as e:
+            except OSError as e:
                 _logger.debug('Cannot remove file [%s]: %s', VNICUtils.__net_exclude_file, str(e))
 
             _logger.debug('Excluded intf: %s ', excludes)
@@ -82,22 +212,55 @@ class VNICUtils:
         """
         self.vnic_info_ts, self.vnic_info = cache.load_cache(VNICUtils.__vnic_info_file)
         if self.vnic_info is None:
-            self.vnic_info = {'exclude': []}
+            self.vnic_info = VNICUtils.__new_vnic_info()
+        # set by the changes not saved yet, see save_vnic_info()
+        self._vnic_info_dirty = False
+        # kept in sync with vnic_info['exclude'] by exclude() and include()
+        self._exclude_set = set(self.vnic_info.get('exclude', ()))
 
         return self.vnic_info
 
-    def save_vnic_info(self):
+    @_invalidates_network_config
+    def save_vnic_info(self, durability='datasync'):
         """
-        Save self.vnic_info in the vnic_info file.
+        Save self.vnic_info in the vnic_info file, if it changed since it
+        was loaded or last saved.
+
+        Parameters
+        ----------
+        durability: str
+            How the write is flushed to disk, see cache.write_cache().
 
         Returns
         -------
         int
             The timestamp of the file or None on failure.
         """
+        if self._batched:
+            return None
+        if not self._vnic_info_dirty:
+            return self.vnic_info_ts
         _logger.debug("Saving vnic_info.")
-        _ = cache.write_cache(cache_content=self.vnic_info,
-                              cache_fname=VNICUtils.__vnic_info_file)
+        _ts = cache.write_cache(cache_content=self.vnic_info,
+                                cache_fname=VNICUtils.__vnic_info_file,
+                                durability=durability)
+        if _ts is not None:
+            self.vnic_info_ts = _ts
+            self._vnic_info_dirty = False
+        return _ts
+
+    @contextmanager
+    def batched_save(self):
+        """
+        Context manager deferring the vnic_info file writes done within it
+        to a single save on exit.
+        """
+        self._batched = True
+        try:
+            yield self
+        finally:
+            self._batched = False
+            self.save_vnic_info()
 
     def set_namespace(self, ns):
         """
@@ -111,7 +274,9 @@ class VNICUtils:
         ns: str
             The namespace value.
         """
-        self.vnic_info['ns'] = ns
+        if self.vnic_info.get('ns') != ns:
+            self.vnic_info['ns'] = ns
+            self._vnic_info_dirty = True
 
     def set_sshd(self, val):
         """
@@ -124,8 +289,11 @@ class VNICUtils:
             the -r option, which, if a namespace is also specified,
             runs sshd in the namespace. The default is False.
         """
-        self.vnic_info['sshd'] = val
+        if self.vnic_info.get('sshd') != val:
+            self.vnic_info['sshd'] = val
+            self._vnic_info_dirty = True
 
+    @_invalidates_network_config
     def add_private_ip(self, ipaddr, vnic_id):
         """
         Add the given secondary private IP to vnic_info save vnic info to
@@ -138,7 +306,8 @@ class VNICUtils:
         vnic_id: int
             The VNIC id.
         """
-        _interfaces = self.get_network_config()
+        # the address is given: the other private IPs of the VNICs are not needed
+        _interfaces = self.get_network_config(include_private_ips=False)
         _intf = None
         for _interface in _interfaces:
             if _interface.get('VNIC') == vnic_id:
@@ -146,7 +315,7 @@ class VNICUtils:
                 break
         if _intf is None:
             # cannot happen
-            _logger.debug('WARNING : cannot find vnic with id [%s]: caller did not check ?')
+            _logger.debug('WARNING : cannot find vnic with id [%s]: caller did not check ?', vnic_id)
         if 'MISSING_SECONDARY_IPS' not in _intf:
             _intf['MISSING_SECONDARY_IPS'] = [ipaddr]
         else:
@@ -155,6 +324,7 @@ class VNICUtils:
 
         self._config_secondary_intf(_intf)
 
+    @_invalidates_network_config
     def del_private_ip(self, ipaddr, vnic_id):
         """
         Delete secondary private IP from vnic_info save vnic_info to the
@@ -173,7 +343,8 @@ class VNICUtils:
             (exit code: int, output message).
         """
 
-        _interfaces = self.get_network_config()
+        # the address is given: the other private IPs of the VNICs are not needed
+        _interfaces = self.get_network_config(include_private_ips=False)
         _interface_to_delete = None
         for _interface in _interfaces:
             if _interface.get('VNIC') == vnic_id \
@@ -203,11 +374,9 @@ class VNICUtils:
         Checks if interface name, VNIC ocid or ip addr is part of excluded items
         """
 
-        for excl in self.vnic_info.get('exclude', ()):
-            if excl in (interface['IFACE'], interface['VNIC'], interface['ADDR']):
-                return True
-        return False
+        return not self._exclude_set.isdisjoint((interface['IFACE'], interface['VNIC'], interface['ADDR']))
 
+    @_invalidates_network_config
     def exclude(self, item):
         """
         Remove item from the "exclude" list. IP addresses or interfaces that are
@@ -218,11 +387,14 @@ class VNICUtils:
         item: str
             Item (IP or interface) to be excluded.
         """
-        if item not in self.vnic_info['exclude']:
+        if item not in self._exclude_set:
             _logger.debug('Adding %s to "exclude" list', item)
             self.vnic_info['exclude'].append(item)
+            self._exclude_set.add(item)
+            self._vnic_info_dirty = True
             self.save_vnic_info()
 
+    @_invalidates_network_config
     def include(self, item):
         """
         Add item to the "exclude" list, IP addresses or interfaces that
@@ -233,11 +405,14 @@ class VNICUtils:
         item: str
             Item (IP or interface) to be excluded.
         """
-        if item in self.vnic_info['exclude']:
+        if item in self._exclude_set:
             _logger.debug('Removing %s from "exclude" list', item)
             self.vnic_info['exclude'].remove(item)
+            self._exclude_set.discard(item)
+            self._vnic_info_dirty = True
             self.save_vnic_info()
 
+    @_invalidates_network_config
     def auto_config(self, sec_ip):
         """
         Auto configure VNICs.
@@ -266,6 +441,11 @@ class VNICUtils:
         # the interfaces to be unconfigured according to metadata
         _all_to_be_deconfigured = []
 
+        # secondary IPs to add, by vnic
+        _sec_ip_by_vnic = {}
+        for (ip, vnic) in sec_ip or ():
+            _sec_ip_by_vnic.setdefault(vnic, []).append(ip)
+
         # 1.1 compose list of interface which need configuration
         # 1.2 compose list of interface which need deconfiguration
         for _intf in _all_intf:
@@ -278,15 +458,10 @@ class VNICUtils:
             if self._is_intf_excluded(_intf):
                 continue
 
-            # add secondary IPs if any
-            if sec_ip:
-                for (ip, vnic) in sec_ip:
-                    if vnic == _intf['VNIC']:
-                        if 'MISSING_SECONDARY_IPS' not in _intf:
-                            _intf['MISSING_SECONDARY_IPS'] = [ip]
-                        else:
-                            if ip not in _intf['MISSING_SECONDARY_IPS']:
-                                _intf['MISSING_SECONDARY_IPS'].append(ip)
+            # add secondary IPs if any, keeping the order and dropping the duplicates in one pass
+            _sec_ips = _sec_ip_by_vnic.get(_intf['VNIC'])
+            if _sec_ips:
+                _intf['MISSING_SECONDARY_IPS'] = list(dict.fromkeys(_intf.get('MISSING_SECONDARY_IPS', []) + _sec_ips))
 
             if _intf['CONFSTATE'] == 'ADD':
                 _all_to_be_configured.append(_intf)
@@ -312,48 +487,102 @@ class VNICUtils:
             for _in in _all_to_be_modified:
                 _logger.debug("MODIFY %s", _in)
 
-        # 2 configure the one which need it
-        for _intf in _all_to_be_configured:
-            ns_i = None
-            if 'ns' in self.vnic_info:
-                # if requested to use namespace, compute namespace name pattern
-                ns_i = {}
-                if self.vnic_info['ns']:
-                    ns_i['name'] = self.vnic_info['ns']
-                else:
-                    ns_i['name'] = 'ons%s' % _intf['IFACE']
+        # the shape is needed for every interface below, get it once
+        _is_bm = self._is_bm()
+
+        # 2 configure the one which need it, they are independent from each other
+        if _all_to_be_configured:
+            with ThreadPoolExecutor(max_workers=min(_CONFIG_MAX_WORKERS, len(_all_to_be_configured))) as _executor:
+                for _future in [_executor.submit(self._auto_config_vnic, _intf, _by_nic_index, _is_bm)
+                                for _intf in _all_to_be_configured]:
+                    _future.result()
+
+        # 3 deconfigure the one which need it, the ones sharing a namespace one after the other
+        #   as the namespace is destroyed with the interface.
+        if _all_to_be_deconfigured:
+            _deconfig_groups = collections.OrderedDict()
+            for _intf in _all_to_be_deconfigured:
+                _deconfig_groups.setdefault(_intf['NS'] if _intf.has('NS') else id(_intf), []).append(_intf)
+            with ThreadPoolExecutor(max_workers=min(_CONFIG_MAX_WORKERS, len(_deconfig_groups))) as _executor:
+                for _future in [_executor.submit(self._auto_deconfig_vnics, _intfs)
+                                for _intfs in _deconfig_groups.values()]:
+                    _future.result()
 
-                ns_i['start_sshd'] = 'sshd' in self.vnic_info
-            try:
-                # for BMs, IFACE can be empty ('-'), we local physical NIC
-                # thank to NIC index
-                # make a copy of it to change the IFACE
-                _intf_to_use = _intf_dict(_intf)
+        # 4 add secondaries IP address
+        if _all_to_be_modified:
+            for _intf in _all_to_be_modified:
+                if _is_bm and _intf['IFACE'] == '-':
+                    # it may happen if we came after configuring the interface by injecting MISSING_SECONDARY_IPS
+                    _intf['IFACE'] = _by_nic_index[_intf['NIC_I']]
+                    _intf['STATE'] = "up"
+            with ThreadPoolExecutor(max_workers=min(_CONFIG_MAX_WORKERS, len(_all_to_be_modified))) as _executor:
+                for _future in [_executor.submit(self._config_secondary_intf, _intf)
+                                for _intf in _all_to_be_modified]:
+                    _future.result()
+
+    def _auto_config_vnic(self, intf, by_nic_index, is_bm):
+        """
+        Configure one interface, see auto_config(). Failures are only logged.
 
-                if self._metadata is None:
-                    raise ValueError('no metadata information')
+        Parameters
+        ----------
+        intf: _intf_dict
+            The interface, as returned by get_network_config().
+        by_nic_index: dict
+            The interface names by physical NIC index.
+        is_bm: bool
+            True on bare metal instances.
+        """
+        ns_i = None
+        if 'ns' in self.vnic_info:
+            # if requested to use namespace, compute namespace name pattern
+            ns_i = {}
+            if self.vnic_info['ns']:
+                ns_i['name'] = self.vnic_info['ns']
+            else:
+                ns_i['name'] = 'ons%s' % intf['IFACE']
+
+            ns_i['start_sshd'] = 'sshd' in self.vnic_info
+        # for BMs, IFACE can be empty ('-'), we local physical NIC
+        # thank to NIC index
+        # make a copy of it to change the IFACE
+        _intf_to_use = _intf_dict.acquire(intf)
+        try:
+            if self._metadata is None:
+                raise ValueError('no metadata information')
 
-                if self._metadata['instance']['shape'].startswith('BM') and _intf['IFACE'] == '-':
-                    _intf_to_use['IFACE'] = _by_nic_index[_intf['NIC_I']]
-                    _intf_to_use['STATE'] = "up"
+            if is_bm and intf['IFACE'] == '-':
+                _intf_to_use['IFACE'] = by_nic_index[intf['NIC_I']]
+                _intf_to_use['STATE'] = "up"
 
-                if _logger.isEnabledFor(logging.DEBUG):
-                    _logger.debug("begin configuration of %s", _intf_to_use)
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("begin configuration of %s", _intf_to_use)
 
-                _auto_config_intf(ns_i, _intf_to_use)
+            _auto_config_intf(ns_i, _intf_to_use, is_bm)
 
-                # disable network manager for that device
-                NetworkHelpers.remove_mac_from_nm(_intf['MAC'])
+            # disable network manager for that device
+            NetworkHelpers.remove_mac_from_nm(intf['MAC'])
 
-                # setup routes
-                self._auto_config_intf_routing(ns_i, _intf_to_use)
+            # setup routes
+            self._auto_config_intf_routing(ns_i, _intf_to_use, is_bm)
 
-            except Exception as e:
-                # best effort , just issue warning
-                _logger.warning('Cannot configure %s: %s', _intf_to_use, str(e))
+        except Exception as e:
+            # best effort , just issue warning
+            _logger.warning('Cannot configure %s: %s', _intf_to_use, str(e))
+        finally:
+            _intf_to_use.release()
+
+    def _auto_deconfig_vnics(self, intfs):
+        """
+        Deconfigure interfaces one after the other, see auto_config().
+        Failures are only logged.
 
-        # 3 deconfigure the one which need it
-        for _intf in _all_to_be_deconfigured:
+        Parameters
+        ----------
+        intfs: list
+            The interfaces, as returned by get_network_config().
+        """
+        for _intf in intfs:
             try:
                 self._auto_deconfig_intf_routing(_intf)
                 _auto_deconfig_intf(_intf)
@@ -361,23 +590,16 @@ class VNICUtils:
                 # best effort , just issue warning
                 _logger.warning('Cannot deconfigure %s: %s', _intf, str(e))
 
-        # 4 add secondaries IP address
-        for _intf in _all_to_be_modified:
-            if self._metadata['instance']['shape'].startswith('BM') and _intf['IFACE'] == '-':
-                # it may happen if we came after configuring the interface by injecting MISSING_SECONDARY_IPS
-                _intf['IFACE'] = _by_nic_index[_intf['NIC_I']]
-                _intf['STATE'] = "up"
-            self._config_secondary_intf(_intf)
-
-    def _deconfig_secondary_addr(self, intf_infos, address):
+    @_invalidates_network_config
+    def _deconfig_secondary_addr(self, intf_infos, *addresses):
         """
-        Removes an IP address from a device
+        Removes IP addresses from a device, the removals are queued if a
+        NetworkHelpers.IpBatch is active.
 
         Parameters:
         -----------
-            device: network device as str
-            address: IP address to be removed
-            namespace: the network namespace (optional)
+            intf_infos: the interface, as returned by get_network_config()
+            addresses: IP addresses to be removed
         Returns:
         --------
           None
@@ -386,10 +608,15 @@ class VNICUtils:
             Exception in case of failure
         """
         _logger.debug("Removing IP addr rules")
-        NetworkHelpers.remove_ip_addr_rules(address)
-        _logger.debug("Removing IP addr [%s] from [%s]", address, intf_infos)
-        NetworkInterfaceSetupHelper(intf_infos).remove_secondary_address(address)
-
+        NetworkHelpers.remove_ip_addr_rules(*addresses)
+        _helper = NetworkInterfaceSetupHelper(intf_infos)
+        _debug = _logger.isEnabledFor(logging.DEBUG)
+        for _address in addresses:
+            if _debug:
+                _logger.debug("Removing IP addr [%s] from [%s]", _address, intf_infos)
+            _helper.remove_secondary_address(_address)
+
+    @_invalidates_network_config
     def auto_deconfig(self, sec_ip):
         """
         De-configure VNICs. Run the secondary vnic script in automatic
@@ -405,7 +632,8 @@ class VNICUtils:
             (exit code: int, output from the "sec vnic" script execution.)
         """
 
-        _all_intf = self.get_network_config()
+        # given addresses are looked up on the system: the private IPs of the VNICs are not needed
+        _all_intf = self.get_network_config(include_private_ips=not sec_ip)
 
         # if we have secondary addrs specified, just take care of these
         #  vnic OCID give us the mac address then select the right interface which has the ip
@@ -413,30 +641,34 @@ class VNICUtils:
             _translated = []
             if self._metadata is None:
                 return 1, 'no metadata available'
-            _all_vnic_md = self._metadata['vnics']
+            _mac_by_vnic = {md_vnic['vnicId']: md_vnic['macAddr'].upper() for md_vnic in self._metadata_vnics()}
             # 1. locate the MAC: translate ip/vnic to ip/mac
             for (ip, vnic) in sec_ip:
-                _found = False
-                for md_vnic in _all_vnic_md:
-                    if md_vnic['vnicId'] == vnic:
-                        _found = True
-                        _logger.debug('located vnic, mac is %s', md_vnic['macAddr'])
-                        _translated.append((ip, md_vnic['macAddr']))
-                        break
-                if not _found:
+                _mac = _mac_by_vnic.get(vnic)
+                if _mac is None:
                     _logger.warning('VNIC not found : %s ', vnic)
+                    continue
+                _logger.debug('located vnic, mac is %s', _mac)
+                _translated.append((ip, _mac))
 
+            _intf_by_mac = collections.defaultdict(list)
+            for intf in _all_intf:
+                _intf_by_mac[intf['MAC']].append(intf)
+            # 2. group the addresses by interface, to remove them all at once
+            _ips_by_intf = collections.OrderedDict()
             for (ip, mac) in _translated:
                 # fecth right intf
                 _found = False
-                for intf in _all_intf:
-                    if intf['MAC'] == mac:
-                        if 'SECONDARY_ADDRS' in intf and ip in intf['SECONDARY_ADDRS']:
-                            _found = True
-                            self._deconfig_secondary_addr(intf, ip)
-                            break
+                for intf in _intf_by_mac.get(mac, ()):
+                    if 'SECONDARY_ADDRS' in intf and ip in intf['SECONDARY_ADDRS']:
+                        _found = True
+                        _ips_by_intf.setdefault(id(intf), (intf, []))[1].append(ip)
+                        break
                 if not _found:
                     _logger.warning('IP %s not found', ip)
+            with NetworkHelpers.IpBatch():
+                for (intf, ips) in _ips_by_intf.values():
+                    self._deconfig_secondary_addr(intf, *ips)
 
         else:
             # unconfigure all
@@ -450,8 +682,7 @@ class VNICUtils:
                 # Is this intf excluded ?
                 if self._is_intf_excluded(intf):
                     continue
-                for secondary_addr in intf.get('SECONDARY_ADDRS', ()):
-                    self._deconfig_secondary_addr(intf, secondary_addr)
+                # _auto_deconfig_intf() removes the secondary addresses as well
                 self._auto_deconfig_intf_routing(intf)
                 _auto_deconfig_intf(intf)
 
@@ -459,19 +690,35 @@ class VNICUtils:
 
     def _get_priv_addrs(self):
         """
-        Gets all vnic private addrs
+        Gets all vnic private addrs, reused for _NETCFG_CACHE_TTL seconds.
         returns:
         --------
           dict : a vnic ocid indexed dict of list of IPs
         """
+        if not self._metadata_vnics():
+            # nothing to correlate with, do not open an OCI session
+            return {}
+        _now = time.monotonic()
+        if self._priv_addrs_cache is None or _now - self._priv_addrs_cache[0] >= VNICUtils._NETCFG_CACHE_TTL:
+            self._priv_addrs_cache = (_now, self._fetch_priv_addrs())
+        return self._priv_addrs_cache[1]
+
+    @staticmethod
+    def _fetch_priv_addrs():
+        """
+        Fetch all vnic private addrs from the OCI API.
+        returns:
+        --------
+          dict : a vnic ocid indexed dict of list of IPs, empty if the OCI
+                 API cannot be used
+        """
         res = {}
-        oci_sess = None
         try:
-            oci_sess = OCISession()
+            p_ips = OCISession().this_instance().all_private_ips()
         except Exception as e:
-            _logger.debug('Cannot get OCI session: %s', str(e))
+            _logger.debug('Cannot get private IPs from OCI API: %s', str(e))
+            return res
 
-        p_ips = oci_sess.this_instance().all_private_ips()
         for p_ip in p_ips:
             _ocid = p_ip.get_vnic_ocid()
             _addr = p_ip.get_address()
@@ -481,12 +728,42 @@ class VNICUtils:
 
         return res
 
-    def get_network_config(self):
+    def get_network_config(self, include_private_ips=True):
+        """
+        Get network configuration, see _build_network_config().
+        The result is reused for _NETCFG_CACHE_TTL seconds, the methods
+        changing the configuration drop it. The caller gets its own copy.
+
+        Parameters
+        ----------
+        include_private_ips: bool
+            Get the secondary private IPs of the VNICs from the OCI API,
+            see _build_network_config().
+
+        Returns
+        -------
+        list of dict
+            The interfaces.
         """
-        Get network configuration.
+        _now = time.monotonic()
+        if self._netcfg_cache is None or self._netcfg_cache[1] != include_private_ips \
+                or _now - self._netcfg_cache[0] >= VNICUtils._NETCFG_CACHE_TTL:
+            self._netcfg_cache = (_now, include_private_ips, self._build_network_config(include_private_ips))
+        return copy.deepcopy(self._netcfg_cache[2])
+
+    def _build_network_config(self, include_private_ips=True):
+        """
+        Build network configuration.
         fetch information from this instance metadata and aggregate
         it to system information. Information form metadata take precedence
 
+        Parameters
+        ----------
+        include_private_ips: bool
+            Get the secondary private IPs of the VNICs from the OCI API. When
+            not set, SECONDARY_ADDRS only lists the addresses found on the
+            system and MISSING_SECONDARY_IPS is never set.
+
         Returns
         -------
         list of dict
@@ -522,83 +799,92 @@ class VNICUtils:
             for _i in _nintfs:
                 _link_by_idx[_i['index']] = _i['device']
 
-        _all_from_system = []
+        # system interfaces indexed by MAC address
+        _all_from_system = collections.defaultdict(list)
         for _namespace, _nintfs in _all_intfs.items():
             for _i in _nintfs:
-                if "NO-CARRIER" in _i['flags'] or "LOOPBACK" in _i['flags']:
+                if not _FLAGS_SKIP.isdisjoint(_i['flags'] or ()):
                     continue
                 if _i['type'] != 'ether':
                     continue
-                _intf = _intf_dict()
-                if _i.get('mac'):
-                    _intf['MAC'] = _i.get('mac')
-                _intf['IFACE'] = _i['device']
-                if 'link' in _i and _i['link'] is not None:
-                    _intf['LINK'] = _i['link']
+                _intf = _intf_dict.acquire()
+                _set = _intf.__setitem__
+                _mac = _i.get('mac')
+                if _mac:
+                    _set('MAC', _mac)
+                _set('IFACE', _i['device'])
+                _link = _i.get('link')
+                if _link is not None:
+                    _set('LINK', _link)
                 else:
                     # in that case, try with index if we have it
                     if _i['link_idx']:
-                        _intf['LINK'] = _link_by_idx[_i['link_idx']]
-                if 'subtype' in _i:
-                    _intf['LINKTYPE'] = _i['subtype']
-                else:
-                    _intf['LINKTYPE'] = 'ether'
-                _intf['IND'] = _i['index']
-                _intf['STATE'] = _i['opstate']
+                        _set('LINK', _link_by_idx[_i['link_idx']])
+                _set('LINKTYPE', _i.get('subtype', 'ether'))
+                _set('IND', _i['index'])
+                _set('STATE', _i['opstate'])
                 # default namespace is empty string
-                if _namespace and _namespace != '':
-                    _intf['NS'] = _namespace
-                if _i.get('vlanid'):
-                    _intf['VLAN'] = _i.get('vlanid')
-                if len(_i.get('addresses', [])) > 0:
-                    _intf['CONFSTATE'] = '-'
-                    _intf['ADDR'] = _i.get('addresses')[0]['address']
-                    if len(_i.get('addresses', [])) > 1:
+                if _namespace:
+                    _set('NS', _namespace)
+                _vlanid = _i.get('vlanid')
+                if _vlanid:
+                    _set('VLAN', _vlanid)
+                _addrs = _i.get('addresses') or ()
+                _naddr = len(_addrs)
+                if _naddr:
+                    _set('CONFSTATE', '-')
+                    _set('ADDR', _addrs[0]['address'])
+                    if _naddr > 1:
                         # first one in the list is the primary address of that vnic
-                        _intf['SECONDARY_ADDRS'] = [ip['address'] for ip in _i.get('addresses')[1:]]
+                        _set('SECONDARY_ADDRS', [ip['address'] for ip in _addrs[1:]])
                 else:
                     if not _i.get('is_vf'):
                         # by default, before correlation, set it to DELETE
                         _intf['CONFSTATE'] = 'DELETE'
 
-                _all_from_system.append(_intf)
+                _all_from_system[_intf['MAC']].append(_intf)
 
         _all_from_metadata = []
         _first_loop = True
         if self._metadata is None:
             _logger.warning('no metadata available')
         else:
-            _ip_per_id = self._get_priv_addrs()
+            _md_vnics = self._metadata_vnics()
+            _ip_per_id = self._get_priv_addrs() if include_private_ips and _md_vnics else {}
 
-            for md_vnic in self._metadata['vnics']:
-                _intf = _intf_dict()
+            for md_vnic in _md_vnics:
+                _intf = _intf_dict.acquire()
                 if _first_loop:
                     # primary always come first
                     _intf['IS_PRIMARY'] = True
                     _first_loop = False
-                _intf['MAC'] = md_vnic['macAddr'].upper()
+                _intf['MAC'] = md_vnic['macAddr']
                 _intf['ADDR'] = md_vnic['privateIp']
-                _intf['SPREFIX'] = md_vnic['subnetCidrBlock'].split('/')[0]
-                _intf['SBITS'] = md_vnic['subnetCidrBlock'].split('/')[1]
+                _intf['SPREFIX'], _intf['SBITS'] = md_vnic['subnetCidrBlock'].split('/', 1)
                 _intf['VIRTRT'] = md_vnic['virtualRouterIp']
                 _intf['VLTAG'] = md_vnic['vlanTag']
-                _intf['VNIC'] = md_vnic['vnicId']
+                _vnic_id = md_vnic['vnicId']
+                _intf['VNIC'] = _vnic_id
                 if 'nicIndex' in md_vnic:
                     # VMs do not have such attr
                     _intf['NIC_I'] = md_vnic['nicIndex']
-                if md_vnic['vnicId'] in _ip_per_id:
+                _vnic_ips = _ip_per_id.get(_vnic_id)
+                if _vnic_ips is not None:
                     # get all but the primary one
-                    _intf['SECONDARY_ADDRS'] = \
-                        [_ip for _ip in _ip_per_id[md_vnic['vnicId']] if _ip != md_vnic['privateIp']]
+                    _private_ip = md_vnic['privateIp']
+                    _intf['SECONDARY_ADDRS'] = [_ip for _ip in _vnic_ips if _ip != _private_ip]
 
                 _all_from_metadata.append(_intf)
 
+        # the excluded ones are flagged while correlating
+        _excl = frozenset(self._exclude_set)
+
         # now we correlate informations
         # precedence is given to metadata
         for interface in _all_from_metadata:
             try:
-                # locate the one with same ether address
-                _candidates = [_i for _i in _all_from_system if _i['MAC'] == interface['MAC']]
+                # locate the one with same ether address, the ones left after correlation are to be deleted
+                _candidates = _all_from_system.pop(interface['MAC'], [])
                 _state = 'ADD'
                 _have_to_be_added = set()
                 if len(_candidates) == 1:
@@ -615,8 +901,13 @@ class VNICUtils:
                     # surely macvlan/vlans involved (BM case)
                     #  the macvlan interface give us the addr and the actual link
                     #  the vlan interface give us the vlan name
-                    _macvlan_is = [_i for _i in _candidates if _i['LINKTYPE'] in ('macvlan', 'macvtap')]
-                    _vlan_is = [_i for _i in _candidates if _i['LINKTYPE'] == 'vlan']
+                    _macvlan_is = []
+                    _vlan_is = []
+                    for _i in _candidates:
+                        if _i['LINKTYPE'] in ('macvlan', 'macvtap'):
+                            _macvlan_is.append(_i)
+                        elif _i['LINKTYPE'] == 'vlan':
+                            _vlan_is.append(_i)
                     if len(_macvlan_is) > 0 and len(_vlan_is) > 0:
                         # treat secondary addrs: if have some in metadata not present on system , we have to plumb them
                         _have_to_be_added = set(interface.get('SECONDARY_ADDRS', [])).difference(
@@ -629,42 +920,49 @@ class VNICUtils:
                         if _vlan_is[0].has('SECONDARY_ADDRS'):
                             interface['SECONDARY_ADDRS'] = _vlan_is[0]['SECONDARY_ADDRS']
                 interface['CONFSTATE'] = _state
-
-                # clean up system list
-                _all_from_system = [_i for _i in _all_from_system if _i['MAC'] != interface['MAC']]
+                # the system interfaces are merged in the metadata one now
+                for _i in _candidates:
+                    _i.release()
             except ValueError as e:
-                _logger.debug('error while parsing [%s]: %s', str(interface), str(e))
+                _logger.debug('error while parsing [%s]: %s', interface, e)
             finally:
                 if len(_have_to_be_added) > 0:
                     # this key will trigger configuration (see auto_config())
-                    interface['MISSING_SECONDARY_IPS'] = list(_have_to_be_added)
+                    # address order (IPv4 and IPv6 may be mixed): stable from one run to the other,
+                    # unlike the set one
+                    interface['MISSING_SECONDARY_IPS'] = sorted(_have_to_be_added,
+                                                                key=lambda _ip: ipaddress.ip_address(_ip).packed)
+                if _excl and not _excl.isdisjoint((interface['IFACE'], interface['VNIC'], interface['ADDR'])):
+                    interface['CONFSTATE'] = 'EXCL'
                 interfaces.append(interface)
 
         # now collect the one left omr system
-        for interface in _all_from_system:
-            interface['CONFSTATE'] = 'DELETE'
-            interfaces.append(interface)
-
-        # final round for the excluded
-        for interface in interfaces:
-            if self._is_intf_excluded(interface):
-                interface['CONFSTATE'] = 'EXCL'
-            if interface['is_vf'] and interface['CONFSTATE'] == 'DELETE':
-                # revert this as '-' , as DELETE state means nothing for VFs
-                interface['CONFSTATE'] = '-'
+        for _left in _all_from_system.values():
+            for interface in _left:
+                if _excl and not _excl.isdisjoint((interface['IFACE'], interface['VNIC'], interface['ADDR'])):
+                    interface['CONFSTATE'] = 'EXCL'
+                elif interface['is_vf']:
+                    # revert this as '-' , as DELETE state means nothing for VFs
+                    interface['CONFSTATE'] = '-'
+                else:
+                    interface['CONFSTATE'] = 'DELETE'
+                interfaces.append(interface)
 
         return interfaces
 
-    def _compute_routing_table_name(self, interface_info):
+    def _compute_routing_table_name(self, interface_info, is_bm=None):
         """
         Compute the routing table name for a givne interface
+        is_bm: True on bare metal instances, looked up if not given
         return the name as str
         """
         if self._metadata is None:
             raise ValueError('no metadata avaialable')
-        if self._metadata['instance']['shape'].startswith('BM'):
-            return 'ort%svl%s' % (interface_info['NIC_I'], interface_info['VLTAG'])
-        return 'ort%s' % interface_info['IND']
+        if is_bm is None:
+            is_bm = self._is_bm()
+        if is_bm:
+            return _routing_table_name(True, interface_info['NIC_I'], interface_info['VLTAG'], None)
+        return _routing_table_name(False, None, None, interface_info['IND'])
 
     def _auto_deconfig_intf_routing(self, intf_infos):
         """
@@ -683,7 +981,8 @@ class VNICUtils:
             NetworkHelpers.remove_ip_addr_rules(_route_table_name)
             NetworkHelpers.delete_route_table(_route_table_name)
 
-    def _auto_config_intf_routing(self, net_namespace_info, intf_infos):
+    @_invalidates_network_config
+    def _auto_config_intf_routing(self, net_namespace_info, intf_infos, is_bm):
         """
         Configure interface routing
         parameter:
@@ -694,13 +993,14 @@ class VNICUtils:
             start_sshd: if True start sshd within the namespace
         intf_info: interface info as dict
             keys: see VNICITils.get_network_config
+        is_bm: True on bare metal instances
 
         Raise:
             Exception. if configuration failed
         """
 
         _intf_to_use = intf_infos['IFACE']
-        if self._metadata['instance']['shape'].startswith('BM') and intf_infos['VLTAG'] != "0":
+        if is_bm and intf_infos['VLTAG'] != "0":
             # in that case we operate on the VLAN tagged intf no
             _intf_to_use = '%sv%s' % (intf_infos['IFACE'], intf_infos['VLTAG'])
 
@@ -713,32 +1013,33 @@ class VNICUtils:
                                 (net_namespace_info['name'], intf_infos['VIRTRT'], out))
             _logger.debug("added namespace %s default gateway %s", net_namespace_info['name'], intf_infos['VIRTRT'])
             if net_namespace_info['start_sshd']:
-                ret = sudo_utils.call(['/usr/sbin/ip', 'netns', 'exec', net_namespace_info['name'], '/usr/sbin/sshd'])
+                ret = NetworkHelpers.call_in_network_namespace(net_namespace_info['name'], ['/usr/sbin/sshd'])
                 if ret != 0:
                     raise Exception("cannot start ssh daemon")
                 _logger.debug('sshd daemon started')
         else:
-            _route_table_name = self._compute_routing_table_name(intf_infos)
+            _route_table_name = self._compute_routing_table_name(intf_infos, is_bm)
 
             NetworkHelpers.add_route_table(_route_table_name)
 
-            _logger.debug("default route add")
-            ret, out = NetworkHelpers.add_static_ip_route(
-                'default', 'via', intf_infos['VIRTRT'], 'dev', _intf_to_use, 'table', _route_table_name)
-            if ret != 0:
-                raise Exception("cannot add default route via %s on %s to table %s" %
-                                (intf_infos['VIRTRT'], _intf_to_use, _route_table_name))
+            # the route and the rule are added by a single ip batch
+            try:
+                with NetworkHelpers.IpBatch(force=False):
+                    _logger.debug("default route add")
+                    NetworkHelpers.add_static_ip_route(
+                        'default', 'via', intf_infos['VIRTRT'], 'dev', _intf_to_use, 'table', _route_table_name)
+
+                    # create source-based rule to use table
+                    NetworkHelpers.add_static_ip_rule('from', intf_infos['ADDR'], 'lookup', _route_table_name)
+            except Exception as e:
+                raise Exception("cannot add default route via %s on %s to table %s and rule from %s" %
+                                (intf_infos['VIRTRT'], _intf_to_use, _route_table_name, intf_infos['ADDR'])) from e
             _logger.debug("added default route via %s dev %s table %s",
                           intf_infos['VIRTRT'], _intf_to_use, _route_table_name)
-
-            # create source-based rule to use table
-            ret, out = NetworkHelpers.add_static_ip_rule('from', intf_infos['ADDR'], 'lookup', _route_table_name)
-            if ret != 0:
-                raise Exception("cannot add rule from %s use table %s" % (intf_infos['ADDR'], _route_table_name))
-
             _logger.debug("added rule for routing from %s lookup %s with default via %s",
                           intf_infos['ADDR'], _route_table_name, intf_infos['VIRTRT'])
 
+    @_invalidates_network_config
     def _config_secondary_intf(self, intf_infos):
         """
         Configures interface secodnary IPs
@@ -757,22 +1058,61 @@ class VNICUtils:
         if intf_infos.has('SECONDARY_ADDRS'):
             _sec_addrs = intf_infos.get('SECONDARY_ADDRS')
 
-        for secondary_ip in intf_infos['MISSING_SECONDARY_IPS']:
-            _logger.debug("adding secondary IP address %s to interface (or VLAN) %s",
-                          secondary_ip, intf_infos['IFACE'])
+        # the rules below refer to the table
+        NetworkHelpers.add_route_table(_route_table_name)
 
-            NetworkInterfaceSetupHelper(intf_infos).add_secondary_address(secondary_ip)
+        # the addresses, in the interface namespace, then the rules, in the default one: one ip batch each
+        try:
+            with NetworkHelpers.IpBatch(force=False):
+                # logged once per interface, not per address
+                _logger.debug("adding secondary IP addresses %s to interface (or VLAN) %s",
+                              intf_infos['MISSING_SECONDARY_IPS'], intf_infos['IFACE'])
+                _helper = NetworkInterfaceSetupHelper(intf_infos)
+                for secondary_ip in intf_infos['MISSING_SECONDARY_IPS']:
+                    _helper.add_secondary_address(secondary_ip)
+
+                # do not duplicate the rules of a previous run
+                _rules = NetworkHelpers.get_ip_rules()
+                _new_rule_ips = [_ip for _ip in intf_infos['MISSING_SECONDARY_IPS']
+                                 if (_ip, _route_table_name) not in _rules]
+                for secondary_ip in _new_rule_ips:
+                    NetworkHelpers.add_static_ip_rule('from', secondary_ip, 'lookup', _route_table_name)
+                _logger.debug("adding rules for routing from %s lookup %s with default via %s, %d already exist",
+                              _new_rule_ips, _route_table_name, intf_infos['VIRTRT'],
+                              len(intf_infos['MISSING_SECONDARY_IPS']) - len(_new_rule_ips))
+        except Exception as e:
+            raise Exception("cannot add secondary IP addresses %s and their rules to table %s" %
+                            (intf_infos['MISSING_SECONDARY_IPS'], _route_table_name)) from e
 
-            NetworkHelpers.add_route_table(_route_table_name)
 
-            ret, _ = NetworkHelpers.add_static_ip_rule('from', secondary_ip, 'lookup', _route_table_name)
-            if ret != 0:
-                raise Exception("cannot add rule from %s use table %s" % (secondary_ip, _route_table_name))
-            _logger.debug("added rule for routing from %s lookup %s with default via %s",
-                          secondary_ip, _route_table_name, intf_infos['VIRTRT'])
+@functools.lru_cache(maxsize=128)
+def _routing_table_name(is_bm, nic_index, vlan_tag, intf_index):
+    """
+    Compute a routing table name, see VNICUtils._compute_routing_table_name().
+    Use _routing_table_name.cache_clear() to drop the memoized names.
+
+    Parameters
+    ----------
+    is_bm: bool
+        Is the instance a BM one ?
+    nic_index: str
+        The physical NIC index (BM only).
+    vlan_tag: str
+        The VLAN tag (BM only).
+    intf_index: str
+        The interface system index (VM only).
+
+    Returns
+    -------
+        str
+            The routing table name.
+    """
+    if is_bm:
+        return 'ort%svl%s' % (nic_index, vlan_tag)
+    return 'ort%s' % intf_index
 
 
-def _auto_config_intf(net_namespace_info, intf_infos):
+def _auto_config_intf(net_namespace_info, intf_infos, is_bm):
     """
     Configures interface
 
@@ -784,25 +1124,21 @@ def _auto_config_intf(net_namespace_info, intf_infos):
         start_sshd: if True start sshd within the namespace
     intf_info: interface info as dict
         keys: see VNICITils.get_network_config
+    is_bm: True on bare metal instances
 
     Raise:
         Exception. if configuration failed
     """
-    # if interface is not up bring it up
-    if intf_infos['STATE'] != 'up':
-        _logger.debug('Bringing intf [%s] up ', intf_infos['IFACE'])
-        ret = sudo_utils.call(['/usr/sbin/ip', 'link', 'set', 'dev', intf_infos['IFACE'], 'up'])
-        if ret != 0:
-            raise Exception('Cannot bring interface up')
-
     # create network namespace if needed
     if net_namespace_info is not None:
-        if not NetworkHelpers.is_network_namespace_exists(net_namespace_info['name']):
-            _logger.debug('creating namespace [%s]', net_namespace_info['name'])
-            NetworkHelpers.create_network_namespace(net_namespace_info['name'])
-        NetworkInterfaceSetupHelper(intf_infos, net_namespace_info['name']).setup()
+        # several interfaces may be configured in the same namespace at once
+        with _netns_lock:
+            if not NetworkHelpers.is_network_namespace_exists(net_namespace_info['name']):
+                _logger.debug('creating namespace [%s]', net_namespace_info['name'])
+                NetworkHelpers.create_network_namespace(net_namespace_info['name'])
+        NetworkInterfaceSetupHelper(intf_infos, net_namespace_info['name']).setup(is_bm)
     else:
-        NetworkInterfaceSetupHelper(intf_infos).setup()
+        NetworkInterfaceSetupHelper(intf_infos).setup(is_bm)
 
 
 def _auto_deconfig_intf(intf_infos):
@@ -819,13 +1155,27 @@ def _auto_deconfig_intf(intf_infos):
     """
     if intf_infos.has('NS'):
         NetworkHelpers.kill_processes_in_namespace(intf_infos['NS'])
-    # TODO EJANNET : LOOP on ('SECONDARY_ADDRS')
-    #    -> NetworkInterfaceSetupHelper(intf_infos).remove_secondary_address()
-    NetworkInterfaceSetupHelper(intf_infos).tear_down()
+    _helper = NetworkInterfaceSetupHelper(intf_infos)
+    if intf_infos.get('SECONDARY_ADDRS'):
+        # secondary addresses and their rules in one ip batch, best effort: a rule or an address
+        # already gone must not prevent the interface and the namespace from being cleaned up
+        try:
+            with NetworkHelpers.IpBatch():
+                NetworkHelpers.remove_ip_addr_rules(*intf_infos['SECONDARY_ADDRS'])
+                # deleting the VLAN removes all its addresses
+                if not intf_infos.has('VLAN'):
+                    for _address in intf_infos['SECONDARY_ADDRS']:
+                        _helper.remove_secondary_address(_address)
+        except Exception as e:
+            _logger.warning('Cannot remove secondary addresses of %s: %s', intf_infos['IFACE'], str(e))
+    _helper.tear_down()
 
-    # delete namespace
+    # delete namespace, or only empty it to be reused by the next configuration
     if intf_infos.has('NS'):
-        _logger.debug('deleting namespace [%s]', intf_infos['NS'])
-        NetworkHelpers.destroy_network_namespace(intf_infos['NS'])
+        if OCIUtilsConfiguration.getboolean('vnic', 'keep_namespaces', fallback=False):
+            NetworkHelpers.release_network_namespace(intf_infos['NS'])
+        else:
+            _logger.debug('deleting namespace [%s]', intf_infos['NS'])
+            NetworkHelpers.destroy_network_namespace(intf_infos['NS'])
 
     NetworkHelpers.add_mac_to_nm(intf_infos['MAC'])
@@ -154,6 +154,22 @@ class testOciCache(OciTestCase):
         self.assertEqual(load_cache(self.file3),
                          (ts, {'hello': 'again'}))
 
+    def test_write_cache_replace(self):
+        """
+        Test cache.write_cache() replaces the file, keeping its permissions.
+
+        Returns
+        -------
+            No return value.
+        """
+        os.chmod(self.file1, 0o600)
+        self.assertTrue(write_cache(cache_fname=self.file1,
+                                    cache_content={'hello': 'world'}))
+        self.assertEqual(os.stat(self.file1).st_mode & 0o777, 0o600)
+        self.assertEqual(load_cache(self.file1)[1], {'hello': 'world'})
+        self.assertEqual([_f for _f in os.listdir(os.path.dirname(self.file1))
+                          if _f.startswith(os.path.basename(self.file1) + '.')], [])
+
 
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(testOciCache)
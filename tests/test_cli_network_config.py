@@ -5,8 +5,10 @@
 import os
 import re
 import subprocess
+import threading
 import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from ipaddress import ip_address
 
 import oci_utils.oci_api
@@ -15,6 +17,11 @@ from tools.oci_test_case import OciTestCase
 os.environ['LC_ALL'] = 'en_US.UTF8'
 
 
+# the output modes of the show commands
+_OUTPUT_MODES = ('parsable', 'table', 'json', 'text')
+_IPV4_RE = re.compile(r'\b(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\b')
+
+
 def _get_ip_from_response(response):
     """
     Filter ipv4 addresses from string.
@@ -28,13 +35,45 @@ def _get_ip_from_response(response):
     -------
         list: list with ip4 addresses.
     """
-    ip = re.findall(r'\b(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\b', response)
-    return ip
+    return _IPV4_RE.findall(response)
 
 
 class TestCliOciNetworkConfig(OciTestCase):
     """ oci-iscsi-config tests.
     """
+    # the OCI session and the VNICs, shared by the tests, see _get_vnic()
+    _session = None
+    _instance = None
+    _allvnics = None
+    # the VNICs by display name, the first one for duplicate names
+    _vnics_by_name = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Test class initialisation: drop the VNICs of a previous class run.
+
+        Returns
+        -------
+            No return value.
+        """
+        super().setUpClass()
+        cls._refresh_vnics()
+
+    @classmethod
+    def _refresh_vnics(cls):
+        """
+        Make the next _get_vnic() fetch the VNICs again, to be called after
+        a VNIC is attached or detached.
+
+        Returns
+        -------
+            No return value.
+        """
+        with cls._lock:
+            cls._allvnics = None
+            cls._vnics_by_name = None
 
     def setUp(self):
         """
@@ -54,9 +93,6 @@ class TestCliOciNetworkConfig(OciTestCase):
         self.oci_net_config = self.properties.get_property('oci-network-config')
         if not os.path.exists(self.oci_net_config):
             raise unittest.SkipTest("%s not present" % self.oci_net_config)
-        self._session = None
-        self._instance = None
-        self._allvnics = None
         try:
             self.waittime = int(self.properties.get_property('waittime'))
         except Exception:
@@ -74,17 +110,145 @@ class TestCliOciNetworkConfig(OciTestCase):
 
     def _get_vnic(self):
         """
-        Get the list of all vcn's for this instance.
+        Get the list of all vcn's for this instance. The OCI session is
+        created once for all the tests, the list is fetched once until
+        _refresh_vnics() is called.
 
         Returns
         -------
             list of OCIVCN
         """
-        if self._session is None:
-            self._session = oci_utils.oci_api.OCISession()
-            self._instance = self._session.this_instance()
-            self._allvnics = self._instance.all_vnics()
-        return self._allvnics
+        _cls = TestCliOciNetworkConfig
+        with _cls._lock:
+            if _cls._session is None:
+                _cls._session = oci_utils.oci_api.OCISession()
+                _cls._instance = _cls._session.this_instance()
+            if _cls._allvnics is None:
+                _cls._allvnics = _cls._instance.all_vnics()
+                _cls._vnics_by_name = {}
+                for _vnic in _cls._allvnics:
+                    _cls._vnics_by_name.setdefault(_vnic.get_display_name(), _vnic)
+            return _cls._allvnics
+
+    def _get_vnic_by_name(self, name):
+        """
+        Get the vcn with display name name.
+
+        Parameters
+        ----------
+        name: str
+            the display name of the vcn
+
+        Returns
+        -------
+            OCIVNIC: the vcn.
+        """
+        self._get_vnic()
+        return TestCliOciNetworkConfig._vnics_by_name[name]
+
+    def _wait_until(self, predicate, interval=2):
+        """
+        Wait until the OCI resources reach a state, for waittime seconds at
+        most. The VNICs are fetched again before each check.
+
+        Parameters
+        ----------
+        predicate: callable
+            Returns True once the state is reached; an exception raised by it
+            is handled as False, the resources may be in a transient state.
+        interval: int
+            The number of seconds between two checks.
+
+        Returns
+        -------
+            bool: True if the state has been reached.
+        """
+        _deadline = time.monotonic() + self.waittime
+        while True:
+            self._refresh_vnics()
+            try:
+                if predicate():
+                    return True
+            except Exception:
+                pass
+            _left = _deadline - time.monotonic()
+            if _left <= 0:
+                return False
+            time.sleep(min(interval, _left))
+
+    def _vnic_ocids(self):
+        """
+        Get the ocids of the vcn's of this instance.
+
+        Returns
+        -------
+            list of str
+        """
+        return [vn.get_ocid() for vn in self._get_vnic()]
+
+    def _vnic_private_ips(self):
+        """
+        Get the private ips of the vcn's of this instance.
+
+        Returns
+        -------
+            list of str
+        """
+        return [vn.get_private_ip() for vn in self._get_vnic()]
+
+    def _vnic_secondary_ips(self, name):
+        """
+        Get the secondary private ips of the vcn with display name name.
+
+        Parameters
+        ----------
+        name: str
+            the display name of the vcn
+
+        Returns
+        -------
+            list of str
+        """
+        return [pip.get_address() for pip in self._get_vnic_by_name(name).all_private_ips()]
+
+    def _run(self, *args):
+        """
+        Run oci-network-config.
+
+        Parameters
+        ----------
+        args: str
+            The command line arguments.
+
+        Returns
+        -------
+            str: the command output.
+
+        Raises
+        ------
+        subprocess.CalledProcessError
+            If the command fails.
+        """
+        return subprocess.run((self.oci_net_config,) + args, stdout=subprocess.PIPE, check=True).stdout.decode('utf-8')
+
+    def _run_many(self, *argvs):
+        """
+        Run independent read-only oci-network-config commands concurrently,
+        see _run(). The outputs are printed in the order of argvs.
+
+        Parameters
+        ----------
+        argvs: tuple
+            The command line arguments of each command.
+
+        Raises
+        ------
+        subprocess.CalledProcessError
+            If a command fails.
+        """
+        with ThreadPoolExecutor(max_workers=4) as _executor:
+            for _out in _executor.map(lambda _argv: self._run(*_argv), argvs):
+                print(_out)
 
     def _get_vnic_ocid(self, name):
         """
@@ -99,12 +263,7 @@ class TestCliOciNetworkConfig(OciTestCase):
         -------
             str: the ocid.
         """
-        all_vnics = self._get_vnic()
-        for vn in all_vnics:
-            if vn.get_display_name() == name:
-                vn_ocid = vn.get_ocid()
-                break
-        return vn_ocid
+        return self._get_vnic_by_name(name).get_ocid()
 
     def _get_vnic_private_ip(self, name):
         """
@@ -119,12 +278,7 @@ class TestCliOciNetworkConfig(OciTestCase):
         -------
             str: the ocid.
         """
-        all_vnics = self._get_vnic()
-        for vn in all_vnics:
-            if vn.get_display_name() == name:
-                vn_pip = vn.get_private_ip()
-                break
-        return vn_pip
+        return self._get_vnic_by_name(name).get_private_ip()
 
     def test_display_help(self):
         """
@@ -134,19 +288,19 @@ class TestCliOciNetworkConfig(OciTestCase):
         -------
             No return value.
         """
+        # the helps are independent: run them concurrently, the interpreter startups dominate the duration
+        _subcommands = ('', 'usage', 'show', 'show-vnics', 'configure', 'unconfigure', 'attach-vnic',
+                        'detach-vnic', 'add-secondary-addr', 'remove-secondary-addr')
         try:
-            _ = subprocess.check_output([self.oci_net_config, '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'usage', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'show', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'show-vnics', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'configure', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'unconfigure', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'attach-vnic', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'detach-vnic', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'add-secondary-addr', '--help'])
-            _ = subprocess.check_output([self.oci_net_config, 'remove-secondary-addr', '--help'])
+            _procs = [(_sub, subprocess.Popen([self.oci_net_config] + ([_sub] if _sub else []) + ['--help'],
+                                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+                      for _sub in _subcommands]
         except Exception as e:
             self.fail('Execution has failed: %s' % str(e))
+        for _sub, _proc in _procs:
+            _out, _ = _proc.communicate()
+            with self.subTest(subcommand=_sub):
+                self.assertEqual(_proc.returncode, 0, 'Execution has failed: %s' % _out.decode('utf-8'))
 
     def test_show_no_check(self):
         """
@@ -157,13 +311,10 @@ class TestCliOciNetworkConfig(OciTestCase):
             No return value.
         """
         try:
-            print(subprocess.check_output([self.oci_net_config, '--show']).decode('utf-8'))
-            print(subprocess.check_output([self.oci_net_config, 'show']).decode('utf-8'))
-            print(subprocess.check_output([self.oci_net_config, 'show', '--details']).decode('utf-8'))
-            print(subprocess.check_output([self.oci_net_config, 'show', '--details', '--output-mode', 'parsable']).decode('utf-8'))
-            print(subprocess.check_output([self.oci_net_config, 'show', '--details', '--output-mode', 'table']).decode('utf-8'))
-            print(subprocess.check_output([self.oci_net_config, 'show', '--details', '--output-mode', 'json']).decode('utf-8'))
-            print(subprocess.check_output([self.oci_net_config, 'show', '--details', '--output-mode', 'text']).decode('utf-8'))
+            self._run_many(('--show',),
+                           ('show',),
+                           ('show', '--details'),
+                           *[('show', '--details', '--output-mode', _mode) for _mode in _OUTPUT_MODES])
         except Exception as e:
             self.fail('Execution has failed: %s' % str(e))
 
@@ -176,24 +327,13 @@ class TestCliOciNetworkConfig(OciTestCase):
             No return value.
         """
         try:
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--details']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--details', '--output-mode', 'parsable']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--details', '--output-mode', 'table']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--details', '--output-mode', 'json']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--details', '--output-mode', 'text']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--ocid', self._get_vnic()[0].get_ocid(), '--details']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--name', self._get_vnic()[0].get_display_name(), '--details']).decode('utf-8'))
-            print(subprocess.check_output(
-                [self.oci_net_config, 'show-vnics', '--ip-address', self._get_vnic()[0].get_private_ip(), '--details']).decode('utf-8'))
+            _vnic = self._get_vnic()[0]
+            self._run_many(('show-vnics',),
+                           ('show-vnics', '--details'),
+                           *[('show-vnics', '--details', '--output-mode', _mode) for _mode in _OUTPUT_MODES],
+                           ('show-vnics', '--ocid', _vnic.get_ocid(), '--details'),
+                           ('show-vnics', '--name', _vnic.get_display_name(), '--details'),
+                           ('show-vnics', '--ip-address', _vnic.get_private_ip(), '--details'))
         except Exception as e:
             self.fail('Execution has failed: %s' % str(e))
 
@@ -222,11 +362,13 @@ class TestCliOciNetworkConfig(OciTestCase):
             self.assertIn('creating', subprocess.check_output(
                 [self.oci_net_config, 'attach-vnic', '--name', self.vnic_name]).decode('utf-8'),
                           'attach vnic failed')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: self._get_vnic_by_name(self.vnic_name)),
+                            'vnic %s not attached' % self.vnic_name)
             vn_ocid = self._get_vnic_ocid(self.vnic_name)
             self.assertEqual(subprocess.check_output(
                 [self.oci_net_config, 'detach-vnic', '--ocid', vn_ocid]).decode('utf-8'), '')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: vn_ocid not in self._vnic_ocids()),
+                            'vnic %s not detached' % vn_ocid)
         except Exception as e:
             self.fail('Execution oci-network-config attach detach has failed: %s' % str(e))
 
@@ -242,7 +384,8 @@ class TestCliOciNetworkConfig(OciTestCase):
             self.assertIn('creating',
                           subprocess.check_output([self.oci_net_config, 'attach-vnic',
                                                    '--name', self.vnic_name]).decode('utf-8'), 'attach vnic failed')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: self._get_vnic_by_name(self.vnic_name)),
+                            'vnic %s not attached' % self.vnic_name)
             vn_ocid = self._get_vnic_ocid(self.vnic_name)
             vn_pip = self._get_vnic_private_ip(self.vnic_name)
             new_ip = str(ip_address(vn_pip) + 1)
@@ -250,14 +393,17 @@ class TestCliOciNetworkConfig(OciTestCase):
                           subprocess.check_output([self.oci_net_config, 'add-secondary-addr',
                                                    '--ocid', vn_ocid,
                                                    '--ip-address', new_ip]).decode('utf-8'), 'adding secondary ip failed')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: new_ip in self._vnic_secondary_ips(self.vnic_name)),
+                            'secondary ip %s not added' % new_ip)
             self.assertIn('deconfigure secondary private IP',
                           subprocess.check_output([self.oci_net_config, 'remove-secondary-addr',
                                                    '--ip-address', new_ip]).decode('utf-8'), 'remove secondary ip failed')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: new_ip not in self._vnic_secondary_ips(self.vnic_name)),
+                            'secondary ip %s not removed' % new_ip)
             self.assertEqual(subprocess.check_output([self.oci_net_config, 'detach-vnic',
                                                       '--ocid', vn_ocid]).decode('utf-8'), '')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: vn_ocid not in self._vnic_ocids()),
+                            'vnic %s not detached' % vn_ocid)
         except Exception as e:
             self.fail('Execution oci-network-config attach detach has  failed: %s' % str(e))
 
@@ -273,10 +419,12 @@ class TestCliOciNetworkConfig(OciTestCase):
             create_data = subprocess.check_output([self.oci_net_config, '--create-vnic']).decode('utf-8')
             self.assertIn('creating', create_data, 'attach vnic failed')
             new_ipv4 = _get_ip_from_response(create_data)
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: new_ipv4[0] in self._vnic_private_ips()),
+                            'vnic with ip %s not attached' % new_ipv4[0])
             self.assertEqual(subprocess.check_output(
                 [self.oci_net_config, '--detach-vnic', new_ipv4[0]]).decode('utf-8'), '')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: new_ipv4[0] not in self._vnic_private_ips()),
+                            'vnic with ip %s not detached' % new_ipv4[0])
         except Exception as e:
             self.fail('Execution oci-network-config attach detach in 0.11 compatibility mode has failed: %s' % str(e))
 
@@ -293,19 +441,23 @@ class TestCliOciNetworkConfig(OciTestCase):
                 [self.oci_net_config, '--create-vnic', '--private-ip', self.new_ip, '--vnic-name', self.vnic_name]).decode('utf-8')
             self.assertIn('creating', create_data, 'attach vnic failed')
             new_ipv4 = _get_ip_from_response(create_data)
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: self._get_vnic_by_name(self.vnic_name)),
+                            'vnic %s not attached' % self.vnic_name)
             new_oci = self._get_vnic_ocid(self.vnic_name)
             add_ip_data = subprocess.check_output(
                 [self.oci_net_config, '--add-private-ip', '--private-ip', self.extra_ip, '--vnic', new_oci]).decode('utf-8')
             self.assertIn('provisioning secondary private IP', add_ip_data, 'add private ip failed.')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: self.extra_ip in self._vnic_secondary_ips(self.vnic_name)),
+                            'private ip %s not added' % self.extra_ip)
             del_ip_data = subprocess.check_output(
                 [self.oci_net_config, '--del-private-ip', self.extra_ip]).decode('utf-8')
             self.assertIn('deconfigure secondary private IP', del_ip_data, 'remove private ip failed')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: self.extra_ip not in self._vnic_secondary_ips(self.vnic_name)),
+                            'private ip %s not removed' % self.extra_ip)
             self.assertEqual(subprocess.check_output(
                 [self.oci_net_config, '--detach-vnic', new_ipv4]).decode('utf-8'), '')
-            time.sleep(self.waittime)
+            self.assertTrue(self._wait_until(lambda: new_oci not in self._vnic_ocids()),
+                            'vnic %s not detached' % new_oci)
         except Exception as e:
             self.fail('Execution oci-network-config attach detach in 0.11 compatibility mode has failed: %s' % str(e))
 
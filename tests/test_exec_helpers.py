@@ -59,6 +59,27 @@ class TestExecHelpers(OciTestCase):
         """
         import oci_utils.impl.sudo_utils
         self.assertFalse(oci_utils.impl.sudo_utils.call(['/bin/ls', '/']))
+        # relative commands are looked up in PATH
+        self.assertFalse(oci_utils.impl.sudo_utils.call(['ls', '/']))
+
+    @skipUnlessRoot()
+    def test_call_output_cached(self):
+        """
+        Test call_output_cached.
+
+        Returns
+        -------
+            No return value.
+        """
+        import oci_utils.impl.sudo_utils
+        first = oci_utils.impl.sudo_utils.call_output_cached(['/bin/ls', '/'])
+        self.assertIsNotNone(first)
+        self.assertIs(oci_utils.impl.sudo_utils.call_output_cached(['/bin/ls', '/']), first)
+        oci_utils.impl.sudo_utils.invalidate()
+        # run again: same content, new object
+        second = oci_utils.impl.sudo_utils.call_output_cached(['/bin/ls', '/'])
+        self.assertIsNot(second, first)
+        self.assertEqual(second, first)
 
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@
 import os
 import socket
 import unittest
+from unittest import mock
 
 from oci_utils.impl.network_helpers import is_ip_reachable
 from tools.oci_test_case import OciTestCase
@@ -62,6 +63,28 @@ class TestNetworkHelpers(OciTestCase):
             int(self.properties.get_property('connect_remote_port'))))
         self.assertFalse(is_ip_reachable('blabber', 80))
 
+    def test_ip_call_netns(self):
+        """
+        Test the ip command lines run in a namespace, directly and batched.
+
+        Returns
+        -------
+            No return value.
+        """
+        from oci_utils.impl import network_helpers
+        with mock.patch('oci_utils.impl.sudo_utils.call', return_value=0) as _call, \
+                mock.patch('oci_utils.impl.sudo_utils.call_input', return_value=0) as _call_input:
+            network_helpers.ip_call(['link', 'set', 'dev', 'eth1', 'up'], 'ns1')
+            _call.assert_called_once_with(['/usr/sbin/ip', '-netns', 'ns1', 'link', 'set', 'dev', 'eth1', 'up'])
+            _call.reset_mock()
+            with network_helpers.IpBatch():
+                network_helpers.ip_call(['addr', 'del', '10.0.0.2/32', 'dev', 'eth1'], 'ns1')
+                network_helpers.ip_call(['addr', 'del', '10.0.0.3/32', 'dev', 'eth1'], 'ns1')
+            _call.assert_not_called()
+            _call_input.assert_called_once_with(
+                ['/usr/sbin/ip', '-netns', 'ns1', '-force', '-batch', '-'],
+                'addr del 10.0.0.2/32 dev eth1\naddr del 10.0.0.3/32 dev eth1\n')
+
 
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestNetworkHelpers)